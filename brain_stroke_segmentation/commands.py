@@ -1,43 +1,153 @@
 """CLI commands for training and inference."""
 
+import functools
+import hashlib
+import os
+import pickle
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 
 import fire
 import torch
-from hydra import compose, initialize_config_dir
-from torch.utils.data import DataLoader
+from omegaconf import DictConfig
+from torch.utils.data import DataLoader, DistributedSampler
 
-from brain_stroke_segmentation.data_loader import create_datasets, download_data
+from brain_stroke_segmentation.dataset import InferenceDataset, collate_skip_missing
 from brain_stroke_segmentation.inference import StrokeInference
-from brain_stroke_segmentation.onnx_converter import convert_to_onnx
-from brain_stroke_segmentation.train import train_model
+from brain_stroke_segmentation.utils import save_prediction_images
+
+CONFIG_CACHE_DIR = Path.home() / ".cache" / "brain_stroke_segmentation"
+
+
+@functools.lru_cache(maxsize=None)
+def _load_cfg(config_path: str, config_name: str) -> DictConfig:
+    """
+    Compose the Hydra config, reusing a pickled copy while the configs are unchanged.
+
+    Args:
+        config_path: Path to configs directory
+        config_name: Name of config file
+
+    Returns:
+        Composed config
+    """
+    config_dir = Path(config_path).absolute()
+    signature = sorted(
+        (str(p.relative_to(config_dir)), p.stat().st_mtime_ns) for p in config_dir.rglob("*.yaml")
+    )
+    key = hashlib.sha1(f"{config_dir}|{config_name}".encode()).hexdigest()[:16]
+    cache_file = CONFIG_CACHE_DIR / f"cfg_{key}.pkl"
+
+    try:
+        with open(cache_file, "rb") as f:
+            cached = pickle.load(f)
+        if cached["signature"] == signature:
+            return cached["cfg"]
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"Warning: Ignoring unreadable config cache {cache_file}: {e}")
+
+    from hydra import compose, initialize_config_dir
+
+    with initialize_config_dir(config_dir=str(config_dir), version_base=None):
+        cfg = compose(config_name=config_name)
+
+    # Every torchrun rank composes the config, so write privately and swap in atomically
+    tmp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+    try:
+        CONFIG_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with open(tmp_file, "wb") as f:
+            pickle.dump({"signature": signature, "cfg": cfg}, f)
+        os.replace(tmp_file, cache_file)
+    except Exception as e:
+        print(f"Warning: Could not cache config: {e}")
+        tmp_file.unlink(missing_ok=True)
+    return cfg
 
 
 def _collect_images(root: Path) -> list[Path]:
+    # os.walk is backed by scandir, so file types come from the directory read without a stat
     extensions = {".png", ".jpg", ".jpeg"}
-    return [p for p in root.rglob("*") if p.is_file() and p.suffix.lower() in extensions]
+    images = []
+    for dirpath, _, filenames in os.walk(root):
+        images += [
+            Path(dirpath, name)
+            for name in filenames
+            if os.path.splitext(name)[1].lower() in extensions
+        ]
+    return sorted(images)
+
+
+def _save_prediction(
+    rgb, prob, binary, output_dir: Path, stem: str, visualize: bool, image_format: str = "png"
+) -> None:
+    if visualize:
+        # Imported lazily so plain inference never pays for matplotlib's startup
+        from brain_stroke_segmentation.visualization import save_prediction_figure
+
+        save_prediction_figure(rgb, prob, binary, output_dir / f"{stem}_prediction.png")
+    else:
+        save_prediction_images(rgb, prob, binary, output_dir, stem, image_format)
+
+
+def _loader_kwargs(train_cfg) -> dict:
+    num_workers = train_cfg.num_workers
+    if num_workers is None:
+        num_workers = min(8, os.cpu_count() or 1)
+    kwargs = {"num_workers": num_workers, "pin_memory": True}
+    if num_workers > 0:
+        kwargs["persistent_workers"] = train_cfg.persistent_workers
+        kwargs["prefetch_factor"] = train_cfg.prefetch_factor
+    return kwargs
 
 
 def train(config_path: str = "configs", config_name: str = "config") -> None:
     """
     Train the stroke segmentation model.
 
+    Launched with ``torchrun --nproc_per_node=N``, it trains with one process per
+    GPU using DistributedDataParallel.
+
     Args:
         config_path: Path to configs directory
         config_name: Name of config file
     """
-    config_dir = Path(config_path).absolute()
-    with initialize_config_dir(config_dir=str(config_dir), version_base=None):
-        cfg = compose(config_name=config_name)
+    # Training-only modules are imported here to keep them out of infer's startup
+    from brain_stroke_segmentation.data_loader import create_datasets, download_data
+    from brain_stroke_segmentation.onnx_converter import convert_to_onnx
+    from brain_stroke_segmentation.train import train_model
 
-    try:
-        import dvc.repo
+    cfg = _load_cfg(config_path, config_name)
 
-        repo = dvc.repo.Repo()
-        repo.pull()
-    except Exception as e:
-        print(f"DVC pull failed: {e}. Trying to download data...")
-        download_data(cfg.data.dataset_path)
+    # torchrun sets WORLD_SIZE and LOCAL_RANK for every process it starts
+    distributed = int(os.environ.get("WORLD_SIZE", "1")) > 1
+    use_gpu = cfg.train.use_gpu and torch.cuda.is_available()
+    is_main = True
+    if distributed:
+        import torch.distributed as dist
+
+        local_rank = int(os.environ["LOCAL_RANK"])
+        if use_gpu:
+            torch.cuda.set_device(local_rank)
+        dist.init_process_group("nccl" if use_gpu else "gloo")
+        device = torch.device("cuda", local_rank) if use_gpu else torch.device("cpu")
+        is_main = dist.get_rank() == 0
+        if not is_main:
+            # Wait until rank 0 has fetched the data and built the dataset caches
+            dist.barrier()
+    else:
+        device = torch.device("cuda" if use_gpu else "cpu")
+
+    if is_main:
+        try:
+            import dvc.repo
+
+            repo = dvc.repo.Repo()
+            repo.pull()
+        except Exception as e:
+            print(f"DVC pull failed: {e}. Trying to download data...")
+            download_data(cfg.data.dataset_path)
 
     train_dataset, val_dataset = create_datasets(
         dataset_path=cfg.data.dataset_path,
@@ -45,26 +155,31 @@ def train(config_path: str = "configs", config_name: str = "config") -> None:
         img_width=cfg.data.img_width,
         test_size=cfg.data.test_size,
         random_state=cfg.data.random_state,
+        cache_dir=cfg.data.cache_dir,
+        gpu_augment=cfg.train.gpu_augment,
     )
+    if distributed and is_main:
+        dist.barrier()
 
+    train_sampler = DistributedSampler(train_dataset) if distributed else None
+    val_sampler = DistributedSampler(val_dataset, shuffle=False) if distributed else None
+    loader_kwargs = _loader_kwargs(cfg.train)
     train_loader = DataLoader(
         train_dataset,
         batch_size=cfg.train.batch_size,
-        shuffle=True,
-        num_workers=cfg.train.num_workers,
-        pin_memory=True,
+        shuffle=train_sampler is None,
+        sampler=train_sampler,
+        drop_last=cfg.train.drop_last,
+        **loader_kwargs,
     )
     val_loader = DataLoader(
         val_dataset,
         batch_size=cfg.train.batch_size,
         shuffle=False,
-        num_workers=cfg.train.num_workers,
-        pin_memory=True,
+        sampler=val_sampler,
+        **loader_kwargs,
     )
 
-    use_gpu = cfg.train.use_gpu and torch.cuda.is_available()
-    device = torch.device("cuda" if use_gpu else "cpu")
-
     model, history = train_model(
         train_loader=train_loader,
         val_loader=val_loader,
@@ -77,8 +192,21 @@ def train(config_path: str = "configs", config_name: str = "config") -> None:
         device=device,
         mlflow_uri=cfg.logging.mlflow_uri if hasattr(cfg.logging, "mlflow_uri") else None,
         log_every_n_steps=cfg.train.log_every_n_steps,
+        use_amp=cfg.train.amp,
+        amp_dtype=cfg.train.amp_dtype,
+        lr_schedule=cfg.train.lr_schedule,
+        accumulation_steps=cfg.train.accumulation_steps,
+        compile_model=cfg.train.compile,
+        compile_mode=cfg.train.compile_mode,
+        channels_last=cfg.train.channels_last,
+        gpu_augment=cfg.train.gpu_augment,
     )
 
+    if distributed:
+        dist.destroy_process_group()
+        if not is_main:
+            return
+
     # Copy best model to models directory
     import shutil
 
@@ -87,8 +215,18 @@ def train(config_path: str = "configs", config_name: str = "config") -> None:
     best_model_source = Path(cfg.train.checkpoint_dir) / "best_model.pth"
     best_model_dest = models_dir / "best_model.pth"
     if best_model_source.exists():
-        shutil.copy2(best_model_source, best_model_dest)
-        print(f"Best model copied to {best_model_dest}")
+        source_stat = best_model_source.stat()
+        dest_stat = best_model_dest.stat() if best_model_dest.exists() else None
+        # copy2 preserves mtime, so an unchanged checkpoint matches on size and mtime
+        if (
+            dest_stat is not None
+            and dest_stat.st_size == source_stat.st_size
+            and dest_stat.st_mtime_ns >= source_stat.st_mtime_ns
+        ):
+            print(f"Best model at {best_model_dest} is up to date")
+        else:
+            shutil.copy2(best_model_source, best_model_dest)
+            print(f"Best model copied to {best_model_dest}")
 
     if cfg.production.convert_onnx:
         try:
@@ -100,6 +238,7 @@ def train(config_path: str = "configs", config_name: str = "config") -> None:
                 img_height=cfg.data.img_height,
                 img_width=cfg.data.img_width,
                 encoder_name=cfg.model.encoder_name,
+                check=cfg.production.onnx_check,
             )
         except Exception as e:
             print(f"Warning: ONNX conversion failed: {e}")
@@ -115,6 +254,7 @@ def infer(
     model_path: str | None = None,
     output_path: str | None = None,
     threshold: float | None = None,
+    visualize: bool | None = None,
 ) -> None:
     """
     Run inference on new images.
@@ -126,22 +266,24 @@ def infer(
         model_path: Override model path from config
         output_path: Override output path from config
         threshold: Override threshold from config
+        visualize: Override visualize from config; save a matplotlib figure per image
+            instead of separate image/probability/mask PNGs
     """
-    config_dir = Path(config_path).absolute()
-    with initialize_config_dir(config_dir=str(config_dir), version_base=None):
-        cfg = compose(config_name=config_name)
+    cfg = _load_cfg(config_path, config_name)
 
-    try:
-        import dvc.repo
+    if cfg.infer.pull_dvc:
+        try:
+            import dvc.repo
 
-        repo = dvc.repo.Repo()
-        repo.pull()
-    except Exception as e:
-        print(f"DVC pull failed: {e}")
+            repo = dvc.repo.Repo()
+            repo.pull()
+        except Exception as e:
+            print(f"DVC pull failed: {e}")
 
     model_path_override = model_path if model_path else cfg.infer.model_path
     output_path_override = output_path if output_path else cfg.infer.output_path
     threshold_override = threshold if threshold is not None else cfg.infer.threshold
+    visualize_override = visualize if visualize is not None else cfg.infer.visualize
 
     inference = StrokeInference(
         model_path=model_path_override,
@@ -149,6 +291,14 @@ def infer(
         img_width=cfg.data.img_width,
         device=cfg.infer.device,
         encoder_name=cfg.model.encoder_name,
+        use_cuda_graph=cfg.infer.use_cuda_graph,
+        half_precision=cfg.infer.half_precision,
+        gpu_decode=cfg.infer.gpu_decode,
+        compile_model=cfg.infer.compile,
+        jit_trace=cfg.infer.jit_trace,
+        channels_last=cfg.infer.channels_last,
+        backend=cfg.infer.backend,
+        int8_calibration_dir=cfg.infer.int8_calibration_dir,
     )
 
     input_path = Path(image_path)
@@ -157,49 +307,72 @@ def infer(
 
     if input_path.is_file():
         rgb, prob, binary = inference.predict(input_path, threshold=threshold_override)
-        import matplotlib.pyplot as plt
-
-        fig, axes = plt.subplots(1, 3, figsize=(15, 5))
-        axes[0].imshow(rgb)
-        axes[0].set_title("Original")
-        axes[0].axis("off")
-        axes[1].imshow(prob, cmap="gray")
-        axes[1].set_title("Probability")
-        axes[1].axis("off")
-        axes[2].imshow(binary, cmap="gray")
-        axes[2].set_title("Binary Mask")
-        axes[2].axis("off")
-        plt.savefig(output_path_final / f"{input_path.stem}_prediction.png")
-        plt.close()
-        print(f"Prediction saved to {output_path_final / f'{input_path.stem}_prediction.png'}")
+        _save_prediction(
+            rgb,
+            prob,
+            binary,
+            output_path_final,
+            input_path.stem,
+            visualize_override,
+            cfg.infer.image_format,
+        )
+        print(f"Prediction for {input_path.name} saved to {output_path_final}")
 
     elif input_path.is_dir():
         image_files = _collect_images(input_path)
         if not image_files:
             print(f"No images found in {input_path}")
             return
-        import matplotlib.pyplot as plt
 
+        # Workers decode the next batch while the GPU runs the current one,
+        # and figures are written in background threads
+        loader = DataLoader(
+            InferenceDataset(image_files, cfg.data.img_height, cfg.data.img_width),
+            batch_size=cfg.infer.batch_size,
+            num_workers=cfg.infer.num_workers,
+            pin_memory=inference.device.type == "cuda",
+            collate_fn=collate_skip_missing,
+        )
+
+        # Workers start loading on iter(), so the warmup overlaps with the first batches
+        batches = iter(loader)
+        if cfg.infer.warmup:
+            inference.warmup(batch_size=cfg.infer.batch_size)
+
+        max_workers = max(1, cfg.infer.num_workers)
+        # Bound the queued writes so the predictions held in memory do not grow with the dataset
+        max_pending = 4 * max_workers
+        pending = set()
         processed = 0
-        for image_path in image_files:
-            rgb, prob, binary = inference.predict(image_path, threshold=threshold_override)
-            rel_path = image_path.relative_to(input_path)
-            output_file = (output_path_final / rel_path).with_suffix(".png")
-            output_file.parent.mkdir(parents=True, exist_ok=True)
-
-            fig, axes = plt.subplots(1, 3, figsize=(15, 5))
-            axes[0].imshow(rgb)
-            axes[0].set_title("Original")
-            axes[0].axis("off")
-            axes[1].imshow(prob, cmap="gray")
-            axes[1].set_title("Probability")
-            axes[1].axis("off")
-            axes[2].imshow(binary, cmap="gray")
-            axes[2].set_title("Binary Mask")
-            axes[2].axis("off")
-            plt.savefig(output_file)
-            plt.close()
-            processed += 1
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for batch in batches:
+                if batch is None:
+                    continue
+                images, paths = batch
+                probs, binaries = inference.predict_tensor(images, threshold=threshold_override)
+                for rgb, prob, binary, image_file in zip(images.numpy(), probs, binaries, paths):
+                    rel_path = Path(image_file).relative_to(input_path)
+                    output_dir = (output_path_final / rel_path).parent
+                    output_dir.mkdir(parents=True, exist_ok=True)
+                    if len(pending) >= max_pending:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            future.result()
+                    pending.add(
+                        executor.submit(
+                            _save_prediction,
+                            rgb,
+                            prob,
+                            binary,
+                            output_dir,
+                            rel_path.stem,
+                            visualize_override,
+                            cfg.infer.image_format,
+                        )
+                    )
+                    processed += 1
+            for future in pending:
+                future.result()
 
         print(f"Processed {processed} images. Results saved to {output_path_final}")
 
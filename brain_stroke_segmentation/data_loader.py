@@ -1,18 +1,135 @@
 """Data loading and preprocessing utilities."""
 
-from glob import glob
+import json
+import logging
+import os
 from pathlib import Path
-from typing import Tuple
+from typing import Sequence, Tuple
 
 from sklearn.model_selection import train_test_split
 
 from brain_stroke_segmentation.dataset import StrokeDataset
 from brain_stroke_segmentation.transforms import get_transforms
 
+IMAGE_EXTENSIONS = (".jpg", ".png", ".jpeg")
+OVERLAY_EXTENSIONS = (".png", ".jpg", ".jpeg")
 
-def load_and_preprocess_data(dataset_path: Path | str) -> Tuple[list[Path], list[Path | None]]:
+logger = logging.getLogger(__name__)
+
+
+def _index_cache_path(dataset_path: Path) -> Path:
+    # Kept next to the dataset rather than inside it so the DVC-tracked output stays clean
+    return dataset_path.parent / f".{dataset_path.name}.index.json"
+
+
+def _index_signature(dataset_path: Path) -> dict[str, int]:
     """
-    Scan dataset folders and pair images with masks.
+    Collect mtimes of every directory the dataset scan reads.
+
+    Adding or removing a file changes its parent directory's mtime, so this is
+    enough to detect a stale index without listing the files themselves.
+
+    Args:
+        dataset_path: Root path to the dataset
+
+    Returns:
+        Mapping of existing directory path to its mtime in nanoseconds
+    """
+    splits = ["CROPPED/TRAIN_CROP", "CROPPED/TEST_CROP", "NON_CROPPED/TRAIN", "NON_CROPPED/TEST"]
+    dirs = []
+    for base in ("stroke_cropped", "stroke_noncropped"):
+        for split in splits:
+            search_dir = dataset_path / base / split
+            for class_dir in ["STROKE", "NORMAL", "Bleeding", "Ischemia", "Normal"]:
+                dirs += [search_dir / class_dir, search_dir / "OVERLAY" / class_dir]
+    for class_dir in ["Bleeding", "Ischemia", "Normal"]:
+        dirs += [dataset_path / class_dir / "PNG", dataset_path / class_dir / "OVERLAY"]
+
+    signature = {}
+    for directory in dirs:
+        try:
+            signature[str(directory)] = directory.stat().st_mtime_ns
+        except OSError:
+            continue
+    return signature
+
+
+def _read_index_cache(
+    cache_file: Path, signature: dict[str, int]
+) -> Tuple[list[Path], list[Path | None]] | None:
+    if not cache_file.exists():
+        return None
+    try:
+        with open(cache_file) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if index.get("signature") != signature:
+        return None
+    images_paths = [Path(p) for p in index["images"]]
+    masks_paths = [Path(p) if p is not None else None for p in index["masks"]]
+    return images_paths, masks_paths
+
+
+def _write_index_cache(
+    cache_file: Path,
+    signature: dict[str, int],
+    images_paths: list[Path],
+    masks_paths: list[Path | None],
+) -> None:
+    index = {
+        "signature": signature,
+        "images": [str(p) for p in images_paths],
+        "masks": [str(p) if p is not None else None for p in masks_paths],
+    }
+    # Concurrent DDP ranks or an interrupted run must never leave a truncated index behind
+    tmp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_file, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        print(f"Warning: Could not write file index cache {cache_file}: {e}")
+        tmp_file.unlink(missing_ok=True)
+
+
+def _list_files(directory: Path, extensions: Sequence[str]) -> list[Path]:
+    """
+    List files with the given extensions using a single directory read.
+
+    Files are grouped by extension in the order given and sorted by path within
+    each group, so the result matches one sorted glob per extension.
+
+    Args:
+        directory: Directory to list
+        extensions: Lowercase extensions to keep, in priority order
+
+    Returns:
+        Matching file paths (empty if the directory is missing)
+    """
+    try:
+        with os.scandir(directory) as entries:
+            files = []
+            for entry in entries:
+                ext = os.path.splitext(entry.name)[1].lower()
+                if ext in extensions and not entry.name.startswith(".") and entry.is_file():
+                    files.append((extensions.index(ext), entry.path))
+    except OSError:
+        return []
+    return [Path(path) for _, path in sorted(files)]
+
+
+def _overlays_by_stem(overlay_dir: Path) -> dict[str, Path]:
+    # _list_files orders by extension priority, so setdefault keeps the preferred match
+    overlays: dict[str, Path] = {}
+    for overlay_file in _list_files(overlay_dir, OVERLAY_EXTENSIONS):
+        overlays.setdefault(overlay_file.stem, overlay_file)
+    return overlays
+
+
+def _scan_dataset(dataset_path: Path) -> Tuple[list[Path], list[Path | None]]:
+    """
+    Walk dataset folders and pair images with masks.
 
     Args:
         dataset_path: Root path to the dataset
@@ -20,16 +137,9 @@ def load_and_preprocess_data(dataset_path: Path | str) -> Tuple[list[Path], list
     Returns:
         Tuple of (image_paths, mask_paths) lists
     """
-    dataset_path = Path(dataset_path)
     images_paths: list[Path] = []
     masks_paths: list[Path | None] = []
 
-    if not dataset_path.exists():
-        print(f"Warning: Dataset path does not exist: {dataset_path}")
-        return images_paths, masks_paths
-
-    print(f"Loading data from: {dataset_path}")
-
     stroke_cropped = dataset_path / "stroke_cropped"
     stroke_noncropped = dataset_path / "stroke_noncropped"
 
@@ -38,8 +148,7 @@ def load_and_preprocess_data(dataset_path: Path | str) -> Tuple[list[Path], list
             if not base_path.exists():
                 continue
 
-            print(f"Searching in: {base_path}")
-            print(f"Contents: {list(base_path.iterdir())[:5]}")
+            logger.debug("Searching in: %s", base_path)
 
             cropped_dirs = [
                 base_path / "CROPPED" / "TRAIN_CROP",
@@ -51,48 +160,32 @@ def load_and_preprocess_data(dataset_path: Path | str) -> Tuple[list[Path], list
             ]
 
             all_search_dirs = cropped_dirs + noncropped_dirs
-            print(f"Search directories: {[str(d) for d in all_search_dirs]}")
+            logger.debug("Search directories: %s", [str(d) for d in all_search_dirs])
 
             for search_dir in all_search_dirs:
                 if not search_dir.exists():
-                    print(f"  Directory does not exist: {search_dir}")
+                    logger.debug("Directory does not exist: %s", search_dir)
                     continue
 
-                print(f"  Checking directory: {search_dir}")
-                print(f"  Contents: {list(search_dir.iterdir())[:5]}")
+                logger.debug("Checking directory: %s", search_dir)
 
                 for class_dir in ["STROKE", "NORMAL", "Bleeding", "Ischemia", "Normal"]:
                     class_path = search_dir / class_dir
                     if not class_path.exists():
                         continue
 
-                    print(f"    Found class directory: {class_path}")
-                    image_files = (
-                        sorted(glob(str(class_path / "*.jpg")))
-                        + sorted(glob(str(class_path / "*.png")))
-                        + sorted(glob(str(class_path / "*.jpeg")))
-                    )
+                    logger.debug("Found class directory: %s", class_path)
+                    image_files = _list_files(class_path, IMAGE_EXTENSIONS)
 
                     if image_files:
-                        print(f"    Found {len(image_files)} images in {class_path}")
+                        logger.debug("Found %s images in %s", len(image_files), class_path)
 
-                        for img_file in image_files:
-                            img_path = Path(img_file)
+                        overlays = _overlays_by_stem(search_dir / "OVERLAY" / class_dir)
+                        for img_path in image_files:
                             images_paths.append(img_path)
-
-                            overlay_file = None
-                            overlay_dir = search_dir / "OVERLAY" / class_dir
-                            if overlay_dir.exists():
-                                filename = img_path.stem
-                                for ext in [".png", ".jpg", ".jpeg"]:
-                                    potential_overlay = overlay_dir / f"{filename}{ext}"
-                                    if potential_overlay.exists():
-                                        overlay_file = potential_overlay
-                                        break
-
-                            masks_paths.append(overlay_file)
+                            masks_paths.append(overlays.get(img_path.stem))
                     else:
-                        print(f"    No image files found in {class_path}")
+                        logger.debug("No image files found in %s", class_path)
     else:
         for class_dir in ["Bleeding", "Ischemia", "Normal"]:
             png_dir = dataset_path / class_dir / "PNG"
@@ -101,19 +194,58 @@ def load_and_preprocess_data(dataset_path: Path | str) -> Tuple[list[Path], list
             if not png_dir.exists():
                 continue
 
-            png_files = sorted(glob(str(png_dir / "*.png")))
-            print(f"Found {len(png_files)} PNG files in {png_dir}")
+            png_files = _list_files(png_dir, (".png",))
+            logger.debug("Found %s PNG files in %s", len(png_files), png_dir)
 
+            overlay_names = {p.name for p in _list_files(overlay_dir, (".png",))}
             for png_file in png_files:
-                filename = Path(png_file).name
-                overlay_file = overlay_dir / filename
-                if overlay_dir.exists() and overlay_file.exists():
-                    images_paths.append(Path(png_file))
-                    masks_paths.append(overlay_file)
+                images_paths.append(png_file)
+                if png_file.name in overlay_names:
+                    masks_paths.append(overlay_dir / png_file.name)
                 else:
-                    images_paths.append(Path(png_file))
                     masks_paths.append(None)
 
+    return images_paths, masks_paths
+
+
+def load_and_preprocess_data(
+    dataset_path: Path | str, use_cache: bool = True
+) -> Tuple[list[Path], list[Path | None]]:
+    """
+    Scan dataset folders and pair images with masks.
+
+    The resulting index is cached in a JSON file next to the dataset and reused
+    while none of the scanned directories have changed.
+
+    Args:
+        dataset_path: Root path to the dataset
+        use_cache: Whether to read and write the file index cache
+
+    Returns:
+        Tuple of (image_paths, mask_paths) lists
+    """
+    dataset_path = Path(dataset_path)
+
+    if not dataset_path.exists():
+        print(f"Warning: Dataset path does not exist: {dataset_path}")
+        return [], []
+
+    logger.debug("Loading data from: %s", dataset_path)
+
+    cached = None
+    if use_cache:
+        cache_file = _index_cache_path(dataset_path)
+        signature = _index_signature(dataset_path)
+        cached = _read_index_cache(cache_file, signature)
+
+    if cached is not None:
+        images_paths, masks_paths = cached
+        logger.debug("Using cached file index: %s", cache_file)
+    else:
+        images_paths, masks_paths = _scan_dataset(dataset_path)
+        if use_cache and images_paths:
+            _write_index_cache(cache_file, signature, images_paths, masks_paths)
+
     print(f"Total images loaded: {len(images_paths)}")
     if len(images_paths) == 0:
         print("Error: No images found! Check dataset structure.")
@@ -128,6 +260,8 @@ def create_datasets(
     img_width: int,
     test_size: float = 0.15,
     random_state: int = 42,
+    cache_dir: Path | str | None = None,
+    gpu_augment: bool = False,
 ) -> Tuple[StrokeDataset, StrokeDataset]:
     """
     Create train and validation datasets.
@@ -138,6 +272,9 @@ def create_datasets(
         img_width: Target image width
         test_size: Fraction of data for validation
         random_state: Random seed for splitting
+        cache_dir: Optional directory for memory-mapped caches of resized images and masks
+        gpu_augment: Leave the training augmentations out of the CPU pipeline because
+            they run on the device (see transforms.DeviceAugment)
 
     Returns:
         Tuple of (train_dataset, val_dataset)
@@ -154,11 +291,22 @@ def create_datasets(
         image_paths, mask_paths, test_size=test_size, random_state=random_state
     )
 
+    # Images stay uint8 until they reach the device, see transforms.DeviceNormalize
     train_dataset = StrokeDataset(
-        train_images, train_masks, img_height, img_width, get_transforms(is_training=True)
+        train_images,
+        train_masks,
+        img_height,
+        img_width,
+        get_transforms(is_training=True, normalize=False, augment=not gpu_augment),
+        cache_dir=cache_dir,
     )
     val_dataset = StrokeDataset(
-        val_images, val_masks, img_height, img_width, get_transforms(is_training=False)
+        val_images,
+        val_masks,
+        img_height,
+        img_width,
+        get_transforms(is_training=False, normalize=False),
+        cache_dir=cache_dir,
     )
 
     return train_dataset, val_dataset
@@ -1,14 +1,27 @@
 """Dataset class for brain stroke segmentation."""
 
+import hashlib
+import os
 from pathlib import Path
-from typing import Callable, Optional
+from typing import Callable, Iterable, Iterator, Optional
 
-import cv2
 import numpy as np
 import torch
 from torch.utils.data import Dataset
 
-from brain_stroke_segmentation.utils import extract_red_mask_from_path
+from brain_stroke_segmentation.utils import extract_red_mask_from_path, read_resized_rgb
+
+# Bump when the resizing or mask extraction changes so stale caches are rebuilt
+_CACHE_VERSION = 1
+
+
+def _file_signature(path: Path | None) -> str:
+    """Return the modification time and size of a file, or "-" if it is absent."""
+    try:
+        stat = path.stat()
+    except (AttributeError, OSError):
+        return "-"
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
 
 
 class StrokeDataset(Dataset):
@@ -21,6 +34,7 @@ class StrokeDataset(Dataset):
         img_height: int,
         img_width: int,
         transforms: Optional[Callable] = None,
+        cache_dir: Path | str | None = None,
     ):
         """
         Initialize dataset.
@@ -31,6 +45,8 @@ class StrokeDataset(Dataset):
             img_height: Target image height
             img_width: Target image width
             transforms: Optional transform function
+            cache_dir: Optional directory for memory-mapped caches of the resized images
+                and extracted masks, built on first use and shared by later runs
         """
         self.image_paths = [Path(p) for p in image_paths]
         self.mask_paths = [Path(p) if p is not None else None for p in mask_paths]
@@ -38,26 +54,178 @@ class StrokeDataset(Dataset):
         self.img_width = img_width
         self.transforms = transforms
 
+        self.image_cache_file = self.mask_cache_file = None
+        self._image_cache = self._mask_cache = None
+        if cache_dir is not None:
+            self.image_cache_file, self.mask_cache_file = self._cache_paths(Path(cache_dir))
+            if not (self.image_cache_file.exists() and self.mask_cache_file.exists()):
+                self._prepare_cache()
+
+    def _cache_paths(self, cache_dir: Path) -> tuple[Path, Path]:
+        """Name the caches after the sample files and target size they were built from."""
+        key = hashlib.sha1(f"v{_CACHE_VERSION}|{self.img_height}x{self.img_width}".encode())
+        for image_path, mask_path in zip(self.image_paths, self.mask_paths):
+            key.update(
+                f"\n{image_path}|{_file_signature(image_path)}"
+                f"|{mask_path}|{_file_signature(mask_path)}".encode()
+            )
+        digest = key.hexdigest()[:16]
+        return cache_dir / f"images_{digest}.u8", cache_dir / f"masks_{digest}.u8"
+
+    def _prepare_cache(self) -> None:
+        """Resize every image and extract every mask once into uint8 memmaps."""
+        self.image_cache_file.parent.mkdir(parents=True, exist_ok=True)
+        image_tmp = self.image_cache_file.with_suffix(".tmp")
+        mask_tmp = self.mask_cache_file.with_suffix(".tmp")
+        print(f"Building dataset cache for {len(self)} samples in {self.image_cache_file.parent}")
+
+        images = np.memmap(
+            image_tmp,
+            dtype=np.uint8,
+            mode="w+",
+            shape=(len(self), self.img_height, self.img_width, 3),
+        )
+        masks = np.memmap(
+            mask_tmp, dtype=np.uint8, mode="w+", shape=(len(self), self.img_height, self.img_width)
+        )
+        for idx in range(len(self)):
+            img = read_resized_rgb(self.image_paths[idx], self.img_width, self.img_height)
+            images[idx] = 0 if img is None else img
+            mask_path = self.mask_paths[idx]
+            mask = extract_red_mask_from_path(mask_path, self.img_width, self.img_height)
+            masks[idx] = 0 if mask is None else mask
+        images.flush()
+        masks.flush()
+        del images, masks
+        os.replace(image_tmp, self.image_cache_file)
+        os.replace(mask_tmp, self.mask_cache_file)
+
+    def _open_cache(self) -> None:
+        """Map the cache files; done lazily so each DataLoader worker maps them itself."""
+        self._image_cache = np.memmap(
+            self.image_cache_file,
+            dtype=np.uint8,
+            mode="r",
+            shape=(len(self), self.img_height, self.img_width, 3),
+        )
+        self._mask_cache = np.memmap(
+            self.mask_cache_file,
+            dtype=np.uint8,
+            mode="r",
+            shape=(len(self), self.img_height, self.img_width),
+        )
+
     def __len__(self) -> int:
         """Return the number of samples in the dataset."""
         return len(self.image_paths)
 
     def __getitem__(self, idx: int) -> tuple[torch.Tensor, torch.Tensor]:
         """Get a sample from the dataset."""
-        img = cv2.imread(str(self.image_paths[idx]))
-        if img is None:
-            img = np.zeros((self.img_height, self.img_width, 3), dtype=np.uint8)
+        if self.image_cache_file is not None:
+            if self._image_cache is None:
+                self._open_cache()
+            # Copy out of the read-only map so transforms can work in place
+            img = np.array(self._image_cache[idx])
+            mask = self._mask_cache[idx].astype(np.float32)
         else:
-            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            img = cv2.resize(img, (self.img_width, self.img_height), interpolation=cv2.INTER_LINEAR)
+            img = read_resized_rgb(self.image_paths[idx], self.img_width, self.img_height)
+            if img is None:
+                img = np.zeros((self.img_height, self.img_width, 3), dtype=np.uint8)
 
-        mask_path = self.mask_paths[idx]
-        mask = extract_red_mask_from_path(mask_path, self.img_width, self.img_height)
-        if mask is None:
-            mask = np.zeros((self.img_height, self.img_width), dtype=np.float32)
+            mask_path = self.mask_paths[idx]
+            mask = extract_red_mask_from_path(mask_path, self.img_width, self.img_height)
+            if mask is None:
+                mask = np.zeros((self.img_height, self.img_width), dtype=np.float32)
 
         if self.transforms:
             transformed = self.transforms(image=img, mask=mask)
             img, mask = transformed["image"], transformed["mask"]
 
         return img, mask
+
+
+class InferenceDataset(Dataset):
+    """Dataset that reads and resizes images for batched inference."""
+
+    def __init__(self, image_paths: list[Path | str], img_height: int, img_width: int):
+        """
+        Initialize dataset.
+
+        Args:
+            image_paths: List of paths to images
+            img_height: Target image height
+            img_width: Target image width
+        """
+        self.image_paths = [Path(p) for p in image_paths]
+        self.img_height = img_height
+        self.img_width = img_width
+
+    def __len__(self) -> int:
+        """Return the number of samples in the dataset."""
+        return len(self.image_paths)
+
+    def __getitem__(self, idx: int) -> tuple[torch.Tensor, str] | None:
+        """Get a uint8 (H, W, 3) RGB tensor and its path, or None if unreadable."""
+        image_path = self.image_paths[idx]
+        rgb = read_resized_rgb(image_path, self.img_width, self.img_height)
+        if rgb is None:
+            print(f"Error processing {image_path}: could not read image")
+            return None
+        return torch.from_numpy(rgb), str(image_path)
+
+
+class CUDAPrefetcher:
+    """Copy the next batch to the GPU on a side stream while the current one is used."""
+
+    def __init__(self, loader: Iterable, device: torch.device):
+        """
+        Initialize prefetcher.
+
+        Args:
+            loader: DataLoader yielding tuples of tensors, ideally from pinned memory
+            device: CUDA device to copy batches to
+        """
+        self.loader = loader
+        self.device = device
+        self.stream = torch.cuda.Stream(device=device)
+
+    def __len__(self) -> int:
+        """Return the number of batches in the wrapped loader."""
+        return len(self.loader)
+
+    def _preload(self, iterator: Iterator) -> tuple | None:
+        try:
+            batch = next(iterator)
+        except StopIteration:
+            return None
+        with torch.cuda.stream(self.stream):
+            return tuple(
+                t.to(self.device, non_blocking=True) if isinstance(t, torch.Tensor) else t
+                for t in batch
+            )
+
+    def __iter__(self) -> Iterator[tuple]:
+        """Yield batches already on ``device``, issuing the next copy before each yield."""
+        iterator = iter(self.loader)
+        next_batch = self._preload(iterator)
+        while next_batch is not None:
+            current_stream = torch.cuda.current_stream(self.device)
+            current_stream.wait_stream(self.stream)
+            batch = next_batch
+            for t in batch:
+                if isinstance(t, torch.Tensor):
+                    # Keep the caching allocator from reusing the memory too early
+                    t.record_stream(current_stream)
+            next_batch = self._preload(iterator)
+            yield batch
+
+
+def collate_skip_missing(
+    samples: list[tuple[torch.Tensor, str] | None],
+) -> tuple[torch.Tensor, list[str]] | None:
+    """Stack readable ``InferenceDataset`` samples, dropping unreadable ones."""
+    samples = [s for s in samples if s is not None]
+    if not samples:
+        return None
+    images, paths = zip(*samples)
+    return torch.stack(images), list(paths)
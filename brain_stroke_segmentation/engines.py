@@ -0,0 +1,152 @@
+"""ONNX Runtime and TensorRT inference backends."""
+
+from pathlib import Path
+
+import numpy as np
+import torch
+
+
+class OnnxRuntimeEngine:
+    """Run an exported ONNX model with ONNX Runtime, keeping CUDA tensors on the device."""
+
+    def __init__(self, onnx_path: Path | str, device: torch.device):
+        """
+        Create the inference session.
+
+        Args:
+            onnx_path: Path to ONNX model exported by ``convert_to_onnx``
+            device: Device that inputs live on; selects the TensorRT/CUDA or CPU providers
+        """
+        import onnxruntime as ort
+
+        onnx_path = Path(onnx_path)
+        if not onnx_path.exists():
+            raise FileNotFoundError(f"ONNX model not found: {onnx_path}")
+
+        if device.type == "cuda":
+            preferred = [
+                "TensorrtExecutionProvider",
+                "CUDAExecutionProvider",
+                "CPUExecutionProvider",
+            ]
+        else:
+            preferred = ["CPUExecutionProvider"]
+        available = ort.get_available_providers()
+        providers = [p for p in preferred if p in available]
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            str(onnx_path), sess_options=options, providers=providers
+        )
+        self.device = device
+        self.input_name = self.session.get_inputs()[0].name
+        output = self.session.get_outputs()[0]
+        self.output_name = output.name
+        # Batch and spatial axes are dynamic; the U-Net keeps the input resolution
+        self._output_channels = output.shape[1]
+
+    def __call__(self, images: torch.Tensor) -> torch.Tensor:
+        """
+        Run the model.
+
+        Args:
+            images: Normalized float32 input batch of shape (N, 3, H, W)
+
+        Returns:
+            Raw logits on the same device as ``images``
+        """
+        images = images.contiguous()
+        if not images.is_cuda:
+            outputs = self.session.run([self.output_name], {self.input_name: images.cpu().numpy()})
+            return torch.from_numpy(outputs[0])
+
+        output = torch.empty(
+            (images.shape[0], self._output_channels, *images.shape[2:]),
+            device=images.device,
+            dtype=torch.float32,
+        )
+        device_id = images.device.index or 0
+        binding = self.session.io_binding()
+        binding.bind_input(
+            self.input_name,
+            device_type="cuda",
+            device_id=device_id,
+            element_type=np.float32,
+            shape=tuple(images.shape),
+            buffer_ptr=images.data_ptr(),
+        )
+        binding.bind_output(
+            self.output_name,
+            device_type="cuda",
+            device_id=device_id,
+            element_type=np.float32,
+            shape=tuple(output.shape),
+            buffer_ptr=output.data_ptr(),
+        )
+        # ONNX Runtime runs on its own stream, so the input must be ready beforehand
+        torch.cuda.current_stream(images.device).synchronize()
+        self.session.run_with_iobinding(binding)
+        binding.synchronize_outputs()
+        return output
+
+
+class TensorRTEngine:
+    """Run a serialized TensorRT engine on CUDA tensors."""
+
+    def __init__(self, engine_path: Path | str, device: torch.device):
+        """
+        Deserialize the engine and create an execution context.
+
+        Args:
+            engine_path: Path to engine built by ``convert_to_tensorrt``
+            device: CUDA device to run on
+        """
+        import tensorrt as trt
+
+        engine_path = Path(engine_path)
+        if not engine_path.exists():
+            raise FileNotFoundError(f"TensorRT engine not found: {engine_path}")
+        if device.type != "cuda":
+            raise ValueError("TensorRT engines require a CUDA device")
+
+        logger = trt.Logger(trt.Logger.WARNING)
+        with trt.Runtime(logger) as runtime:
+            self.engine = runtime.deserialize_cuda_engine(engine_path.read_bytes())
+        if self.engine is None:
+            raise RuntimeError(f"Could not deserialize TensorRT engine: {engine_path}")
+
+        self.context = self.engine.create_execution_context()
+        self.device = device
+        self._names = [self.engine.get_tensor_name(i) for i in range(self.engine.num_io_tensors)]
+        modes = {name: self.engine.get_tensor_mode(name) for name in self._names}
+        self.input_name = next(n for n in self._names if modes[n] == trt.TensorIOMode.INPUT)
+        self.output_name = next(n for n in self._names if modes[n] == trt.TensorIOMode.OUTPUT)
+        self._output = None
+
+    def __call__(self, images: torch.Tensor) -> torch.Tensor:
+        """
+        Run the engine.
+
+        The output buffer is allocated once per input shape and reused, so the
+        result must be consumed before the next call.
+
+        Args:
+            images: Normalized float32 input batch of shape (N, 3, H, W) on CUDA
+
+        Returns:
+            Raw logits
+        """
+        images = images.contiguous()
+        self.context.set_input_shape(self.input_name, tuple(images.shape))
+        output_shape = tuple(self.context.get_tensor_shape(self.output_name))
+        if self._output is None or tuple(self._output.shape) != output_shape:
+            self._output = torch.empty(output_shape, device=self.device, dtype=torch.float32)
+
+        addresses = {
+            self.input_name: images.data_ptr(),
+            self.output_name: self._output.data_ptr(),
+        }
+        torch.cuda.current_stream(images.device).synchronize()
+        self.context.execute_v2([addresses[name] for name in self._names])
+        return self._output
@@ -1,18 +1,23 @@
 """Inference utilities for stroke segmentation."""
 
-import os
 from pathlib import Path
 from typing import Tuple
 
-import cv2
 import numpy as np
 import torch
+import torchvision.io as tvio
+import torchvision.transforms.v2.functional as TF
 
-from brain_stroke_segmentation.model import build_model
-from brain_stroke_segmentation.transforms import get_transforms
+from brain_stroke_segmentation.engines import OnnxRuntimeEngine, TensorRTEngine
+from brain_stroke_segmentation.model import build_model, load_state_dict
+from brain_stroke_segmentation.transforms import DeviceNormalize
+from brain_stroke_segmentation.utils import read_resized_rgb
 
-# Set environment variable to avoid torchvision nms issues
-os.environ.setdefault("TORCHVISION_OPS_USE_CUDA", "0")
+# Backend picked by ``backend="auto"`` from the model file extension
+BACKEND_BY_SUFFIX = {".onnx": "ort", ".trt": "trt", ".plan": "trt", ".engine": "trt"}
+
+# Formats decoded on the GPU with nvJPEG
+GPU_DECODE_SUFFIXES = (".jpg", ".jpeg")
 
 
 class StrokeInference:
@@ -25,6 +30,14 @@ class StrokeInference:
         img_width: int = 256,
         device: str = "cuda",
         encoder_name: str = "efficientnet-b4",
+        use_cuda_graph: bool = True,
+        half_precision: bool = True,
+        gpu_decode: bool = False,
+        compile_model: bool = False,
+        jit_trace: bool = False,
+        channels_last: bool = True,
+        backend: str = "torch",
+        int8_calibration_dir: Path | str | None = None,
     ):
         """
         Initialize inference model.
@@ -35,40 +48,77 @@ class StrokeInference:
             img_width: Image width
             device: Device to run inference on
             encoder_name: Encoder name used in training
+            use_cuda_graph: Capture the single-image forward pass into a CUDA graph
+                (ignored on CPU)
+            half_precision: Run the model in FP16 (ignored on CPU)
+            gpu_decode: Decode and resize JPEGs on the GPU with nvJPEG (ignored on CPU).
+                Off by default: nvJPEG decodes at full resolution, so its pixels differ
+                slightly from the reduced cv2 decode used in training. Normalization
+                always runs on ``device``
+            compile_model: Compile the model with torch.compile in reduce-overhead mode
+                instead of capturing a CUDA graph manually (ignored on CPU)
+            jit_trace: Trace the model with TorchScript and optimize it for inference
+                (conv/BN folding); also applies on CPU, ignored when compile_model is used
+            channels_last: Keep the model and its inputs in NHWC memory format and let
+                cuDNN autotune convolution algorithms (ignored on CPU)
+            backend: ``"torch"`` for PyTorch weights, ``"ort"`` for an ONNX model run with
+                ONNX Runtime (PyTorch weights are exported to a ``.onnx`` file next to
+                them first), ``"trt"`` for a serialized TensorRT engine, or ``"auto"`` to
+                pick by the model file extension. The PyTorch-specific options above are
+                ignored by the ONNX Runtime and TensorRT backends.
+            int8_calibration_dir: With the ``"ort"`` backend, quantize the ONNX model to
+                INT8 using images from this directory for calibration and run the
+                quantized model. Mainly for CPU inference, where ONNX Runtime runs the
+                convolutions with INT8 kernels
         """
         self.img_height = img_height
         self.img_width = img_width
-        self.device = torch.device(device if torch.cuda.is_available() else "cpu")
-        self.transforms = get_transforms(is_training=False)
-
+        self.device = torch.device(device)
+        if self.device.type == "cuda" and not torch.cuda.is_available():
+            self.device = torch.device("cpu")
         model_path = Path(model_path)
+        if backend == "auto":
+            backend = BACKEND_BY_SUFFIX.get(model_path.suffix.lower(), "torch")
+        if backend not in ("torch", "ort", "trt"):
+            raise ValueError(f"Unknown inference backend: {backend}")
+        self.backend = backend
+        use_torch = backend == "torch"
 
-        # Load model on CPU first to avoid torchvision nms issues during weight loading
-        # Temporarily disable torchvision ops to avoid nms operator errors
-        original_env = os.environ.get("TORCHVISION_OPS_USE_CUDA", None)
-        os.environ["TORCHVISION_OPS_USE_CUDA"] = "0"
+        # Exported models take FP32 NCHW input; TensorRT handles FP16 internally
+        use_half = half_precision and self.device.type == "cuda" and use_torch
+        self.dtype = torch.float16 if use_half else torch.float32
+        self._gpu_decode = gpu_decode and self.device.type == "cuda"
+        self._normalize = DeviceNormalize().to(self.device)
+        use_channels_last = channels_last and self.device.type == "cuda" and use_torch
+        self._memory_format = torch.channels_last if use_channels_last else torch.contiguous_format
+        if use_channels_last:
+            # Input shape is fixed, so the one-off autotuning cost is paid only once
+            torch.backends.cudnn.benchmark = True
 
-        try:
-            self.model = build_model(encoder_name=encoder_name)
+        self._graph = None
+        self._pinned = None
+        if backend == "ort":
+            if model_path.suffix.lower() != ".onnx":
+                model_path = self._export_onnx(model_path, encoder_name)
+            if int8_calibration_dir is not None:
+                model_path = self._quantize_onnx(model_path, int8_calibration_dir)
+            self.model = OnnxRuntimeEngine(model_path, self.device)
+            return
+        if backend == "trt":
+            self.model = TensorRTEngine(model_path, self.device)
+            return
 
-            try:
-                state_dict = torch.load(model_path, map_location="cpu", weights_only=False)
-            except TypeError:
-                # Fallback for older PyTorch versions that don't support weights_only
-                state_dict = torch.load(model_path, map_location="cpu")
-
-            # Handle both .pth (state_dict) and .ckpt (legacy Lightning format)
-            if isinstance(state_dict, dict) and "state_dict" in state_dict:
-                # Legacy Lightning checkpoint format
-                state_dict = state_dict["state_dict"]
-                # Remove 'model.' prefix if present
-                if any(k.startswith("model.") for k in state_dict.keys()):
-                    state_dict = {
-                        k.replace("model.", ""): v
-                        for k, v in state_dict.items()
-                        if k.startswith("model.")
-                    }
+        # No pretrained encoder is fetched, so building the model never touches
+        # the torchvision ops that need the nms workaround
+        self.model = build_model(encoder_name=encoder_name, encoder_weights=None)
+        state_dict = load_state_dict(model_path)
 
+        try:
+            # On CUDA an exactly matching checkpoint is adopted without copying, since
+            # the move below allocates new tensors anyway. On CPU the parameters would
+            # alias the cached checkpoint, so they are copied in instead
+            self.model.load_state_dict(state_dict, strict=True, assign=self.device.type == "cuda")
+        except (RuntimeError, TypeError):
             # Load state dict with strict=False to handle version mismatches
             missing_keys, unexpected_keys = self.model.load_state_dict(state_dict, strict=False)
             if missing_keys:
@@ -76,16 +126,294 @@ class StrokeInference:
             if unexpected_keys:
                 print(f"Warning: Unexpected keys: {unexpected_keys[:5]}...")
 
-            self.model.eval()
+        self.model.eval()
+
+        # Move to device after loading
+        self.model.to(self.device, dtype=self.dtype, memory_format=self._memory_format)
+
+        if compile_model and self.device.type == "cuda":
+            try:
+                self._compile_model()
+            except Exception as e:
+                print(f"Warning: torch.compile failed ({e}), using eager inference")
+                self.model = getattr(self.model, "_orig_mod", self.model)
+        else:
+            if jit_trace:
+                try:
+                    self._trace_model()
+                except Exception as e:
+                    print(f"Warning: TorchScript tracing failed ({e}), using eager inference")
+            if use_cuda_graph and self.device.type == "cuda":
+                try:
+                    self._capture_cuda_graph()
+                except Exception as e:
+                    print(f"Warning: CUDA graph capture failed ({e}), using eager inference")
+
+    def _export_onnx(self, model_path: Path, encoder_name: str) -> Path:
+        """
+        Export PyTorch weights to an ONNX model next to them, reusing a fresh export.
+
+        Args:
+            model_path: Path to PyTorch model weights (.pth file)
+            encoder_name: Encoder name used in training
+
+        Returns:
+            Path to the ONNX model
+        """
+        onnx_path = model_path.with_suffix(".onnx")
+        if not onnx_path.exists() or onnx_path.stat().st_mtime < model_path.stat().st_mtime:
+            # Export-only dependency, imported only when an export is needed
+            from brain_stroke_segmentation.onnx_converter import convert_to_onnx
+
+            print(f"Exporting {model_path} to {onnx_path} for ONNX Runtime...")
+            convert_to_onnx(model_path, onnx_path, self.img_height, self.img_width, encoder_name)
+        return onnx_path
+
+    def _quantize_onnx(self, onnx_path: Path, calibration_dir: Path | str) -> Path:
+        """
+        Quantize an ONNX model to INT8 next to it, reusing a fresh quantized model.
+
+        Args:
+            onnx_path: Path to FP32 ONNX model
+            calibration_dir: Directory searched recursively for calibration images
+
+        Returns:
+            Path to the INT8 ONNX model
+        """
+        int8_path = onnx_path.with_suffix(".int8.onnx")
+        if not int8_path.exists() or int8_path.stat().st_mtime < onnx_path.stat().st_mtime:
+            from brain_stroke_segmentation.tensorrt_converter import quantize_onnx_int8
+
+            print(f"Calibrating INT8 model {int8_path}...")
+            quantize_onnx_int8(
+                onnx_path,
+                int8_path,
+                calibration_dir,
+                img_height=self.img_height,
+                img_width=self.img_width,
+            )
+        return int8_path
+
+    def _example_input(self, batch_size: int = 1) -> torch.Tensor:
+        """Return a zero input batch in the model's dtype and memory format."""
+        return torch.zeros(
+            batch_size, 3, self.img_height, self.img_width, device=self.device, dtype=self.dtype
+        ).contiguous(memory_format=self._memory_format)
+
+    def warmup(self, batch_size: int = 1, iters: int = 2) -> None:
+        """
+        Run forwards on a dummy batch before real inputs arrive.
+
+        cuDNN autotuning and lazy engine initialization (e.g. ONNX Runtime's
+        TensorRT provider) happen per input shape on the first call, so warming up
+        with the batch size used later keeps that cost out of the first prediction.
+
+        Args:
+            batch_size: Batch size to warm up for
+            iters: Number of forwards to run
+        """
+        dummy = self._example_input(batch_size)
+        try:
+            for _ in range(iters):
+                self._forward(dummy)
+            if self.device.type == "cuda":
+                torch.cuda.synchronize(self.device)
+        except Exception as e:
+            print(f"Warning: warmup with batch size {batch_size} failed ({e})")
+
+    def _trace_model(self, warmup_iters: int = 2) -> None:
+        """
+        Replace the model with a frozen, inference-optimized TorchScript trace.
+
+        Args:
+            warmup_iters: Number of forwards run after tracing so the TorchScript
+                executor specializes before the first prediction
+        """
+        example = self._example_input()
+        with torch.no_grad():
+            traced = torch.jit.trace(self.model, example, check_trace=False)
+        traced = torch.jit.optimize_for_inference(traced)
+        with torch.inference_mode():
+            for _ in range(warmup_iters):
+                traced(example)
+        self.model = traced
+
+    def _compile_model(self, warmup_iters: int = 2) -> None:
+        """
+        Compile the model and trigger compilation before the first prediction.
+
+        ``reduce-overhead`` mode records CUDA graphs on its own, so the manual graph
+        capture is not used together with it.
+
+        Args:
+            warmup_iters: Number of forwards run on a dummy input after compiling
+        """
+        self.model = torch.compile(self.model, mode="reduce-overhead", dynamic=False)
+        dummy = self._example_input()
+        with torch.inference_mode():
+            for _ in range(warmup_iters):
+                self.model(dummy)
+
+    def _capture_cuda_graph(self, warmup_iters: int = 3) -> None:
+        """
+        Capture the fixed-shape forward pass into a CUDA graph.
+
+        Args:
+            warmup_iters: Number of eager forwards run on a side stream before capture
+        """
+        self._static_in = self._example_input()
+
+        # Warm up on a side stream so lazy initialization is not recorded into the graph
+        side_stream = torch.cuda.Stream()
+        side_stream.wait_stream(torch.cuda.current_stream())
+        with torch.inference_mode(), torch.cuda.stream(side_stream):
+            for _ in range(warmup_iters):
+                self.model(self._static_in)
+        torch.cuda.current_stream().wait_stream(side_stream)
+
+        graph = torch.cuda.CUDAGraph()
+        with torch.inference_mode(), torch.cuda.graph(graph):
+            self._static_out = self.model(self._static_in)
+        self._graph = graph
+
+    def _forward(self, image_tensor: torch.Tensor) -> torch.Tensor:
+        """
+        Run the model, replaying the captured CUDA graph when the shape matches.
+
+        The returned tensor may be the graph's static output buffer, so it must be
+        consumed before the next call.
 
-            # Move to device after loading
-            self.model.to(self.device)
-        finally:
-            # Restore original environment variable
-            if original_env is not None:
-                os.environ["TORCHVISION_OPS_USE_CUDA"] = original_env
-            elif "TORCHVISION_OPS_USE_CUDA" in os.environ:
-                del os.environ["TORCHVISION_OPS_USE_CUDA"]
+        Args:
+            image_tensor: Normalized input batch on ``self.device`` in ``self.dtype``
+
+        Returns:
+            Raw logits
+        """
+        with torch.inference_mode():
+            if self._graph is not None and image_tensor.shape == self._static_in.shape:
+                self._static_in.copy_(image_tensor, non_blocking=True)
+                self._graph.replay()
+                return self._static_out
+            return self.model(image_tensor)
+
+    def _load_image(self, image_path: Path | str) -> np.ndarray:
+        """
+        Read an image from disk and resize it to the model input size.
+
+        Args:
+            image_path: Path to input image
+
+        Returns:
+            Resized RGB image
+        """
+        image_path = Path(image_path)
+        if not image_path.exists():
+            raise FileNotFoundError(f"Image not found: {image_path}")
+
+        rgb = read_resized_rgb(image_path, self.img_width, self.img_height)
+        if rgb is None:
+            raise ValueError(f"Could not read image: {image_path}")
+        return rgb
+
+    def _load_image_gpu(self, image_path: Path | str) -> torch.Tensor:
+        """
+        Decode a JPEG on the GPU with nvJPEG and resize it to the model input size.
+
+        Args:
+            image_path: Path to input image
+
+        Returns:
+            Resized RGB uint8 tensor of shape (3, H, W) on ``self.device``
+        """
+        image_path = Path(image_path)
+        if not image_path.exists():
+            raise FileNotFoundError(f"Image not found: {image_path}")
+
+        return self._decode_jpeg_gpu(tvio.read_file(str(image_path)))
+
+    def _decode_jpeg_gpu(self, data: torch.Tensor) -> torch.Tensor:
+        """Decode encoded JPEG bytes (uint8 CPU tensor) on the GPU and resize them."""
+        rgb = tvio.decode_jpeg(data, mode=tvio.ImageReadMode.RGB, device=self.device)
+        # Plain bilinear like the cv2.INTER_LINEAR resize of the training pipeline
+        return TF.resize(rgb, [self.img_height, self.img_width], antialias=False)
+
+    def _prepare(self, image_path: Path | str) -> Tuple[np.ndarray, torch.Tensor]:
+        """
+        Load and preprocess one image.
+
+        Args:
+            image_path: Path to input image
+
+        Returns:
+            Tuple of (resized_rgb, uint8 CHW tensor). The tensor is already on
+            ``self.device`` when the image was decoded on the GPU; normalization
+            happens on the device in ``_upload_batch``.
+        """
+        if self._gpu_decode and Path(image_path).suffix.lower() in GPU_DECODE_SUFFIXES:
+            rgb_t = self._load_image_gpu(image_path)
+            return self._copy_to_host_async(rgb_t), rgb_t
+
+        # nvJPEG cannot decode other formats; resizing on the CPU keeps the upload small
+        rgb_resized = self._load_image(image_path)
+        return rgb_resized, torch.from_numpy(rgb_resized).permute(2, 0, 1)
+
+    def _copy_to_host_async(self, rgb_t: torch.Tensor) -> np.ndarray:
+        """
+        Queue the download of a decoded image without waiting for it.
+
+        The copy goes to page-locked memory behind the work already queued on the
+        current stream, so the forward pass is launched without a sync. The array is
+        filled once ``_postprocess`` has synchronized the stream and must not be read
+        before that.
+
+        Args:
+            rgb_t: Resized RGB uint8 tensor of shape (3, H, W) on ``self.device``
+
+        Returns:
+            Resized RGB image of shape (H, W, 3)
+        """
+        host = torch.empty((rgb_t.shape[1], rgb_t.shape[2], 3), dtype=torch.uint8, pin_memory=True)
+        host.copy_(rgb_t.permute(1, 2, 0), non_blocking=True)
+        return host.numpy()
+
+    @staticmethod
+    def _postprocess(logits: torch.Tensor, threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Apply sigmoid and threshold on the logits' device, then copy to host.
+
+        Args:
+            logits: Raw model output of shape (N, 1, H, W)
+            threshold: Threshold for binary mask
+
+        Returns:
+            Tuple of (probability_maps, binary_masks) with shape (N, H, W)
+        """
+        # Sigmoid in FP32 so half-precision logits do not saturate
+        prob_t = torch.sigmoid(logits[:, 0].float())
+        binary_t = (prob_t > threshold).to(torch.uint8).mul_(255)
+        if prob_t.is_cuda:
+            # Queue both copies and wait once instead of synchronizing per tensor
+            prob_t = prob_t.to("cpu", non_blocking=True)
+            binary_t = binary_t.to("cpu", non_blocking=True)
+            torch.cuda.current_stream(logits.device).synchronize()
+        return prob_t.numpy(), binary_t.numpy()
+
+    def predict_tensor(
+        self, images: torch.Tensor, threshold: float = 0.5
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Predict for a batch of images that are already resized to the model input.
+
+        Args:
+            images: uint8 RGB tensor of shape (N, H, W, 3), e.g. from ``InferenceDataset``
+            threshold: Threshold for binary mask
+
+        Returns:
+            Tuple of (probability_maps, binary_masks) with shape (N, H, W)
+        """
+        batch = images.to(self.device, non_blocking=True).permute(0, 3, 1, 2)
+        batch = self._normalize(batch).to(self.dtype, memory_format=self._memory_format)
+        return self._postprocess(self._forward(batch), threshold)
 
     def predict(
         self, image_path: Path | str, threshold: float = 0.5
@@ -100,48 +428,90 @@ class StrokeInference:
         Returns:
             Tuple of (original_image_rgb, probability_map, binary_mask)
         """
-        image_path = Path(image_path)
-        if not image_path.exists():
-            raise FileNotFoundError(f"Image not found: {image_path}")
+        rgb_resized, image_tensor = self._prepare(image_path)
+        batch = self._upload_batch([image_tensor])
 
-        bgr = cv2.imread(str(image_path))
-        if bgr is None:
-            raise ValueError(f"Could not read image: {image_path}")
+        prob, pred_binary = self._postprocess(self._forward(batch), threshold)
 
-        rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
-        rgb_resized = cv2.resize(
-            rgb, (self.img_width, self.img_height), interpolation=cv2.INTER_LINEAR
-        )
+        return rgb_resized, prob[0], pred_binary[0]
 
-        dummy_mask = np.zeros((self.img_height, self.img_width), dtype=np.float32)
-        sample = self.transforms(image=rgb_resized, mask=dummy_mask)
-        image_tensor = sample["image"].unsqueeze(0).to(self.device)
+    def _upload_batch(self, tensors: list[torch.Tensor]) -> torch.Tensor:
+        """
+        Stack uint8 CHW images into a normalized, model-ready batch on ``self.device``.
 
-        with torch.no_grad():
-            logits = self.model(image_tensor)[0, 0].cpu().numpy()
+        When every image is on the CPU they are stacked into a reused page-locked
+        buffer so the host-to-device copy is asynchronous.
 
-        prob = 1.0 / (1.0 + np.exp(-logits))
-        pred_binary = (prob > threshold).astype(np.uint8) * 255
+        Args:
+            tensors: uint8 CHW image tensors on the CPU or on ``self.device``
 
-        return rgb_resized, prob, pred_binary
+        Returns:
+            Normalized batch in ``self.dtype`` and ``self._memory_format``
+        """
+        if self.device.type == "cuda" and not any(t.is_cuda for t in tensors):
+            shape = (len(tensors), *tensors[0].shape)
+            if self._pinned is None or self._pinned.shape[0] < shape[0]:
+                self._pinned = torch.empty(shape, dtype=torch.uint8, pin_memory=True)
+            batch = torch.stack(tensors, out=self._pinned[: shape[0]])
+        else:
+            batch = torch.stack([t.to(self.device) for t in tensors])
+        batch = batch.to(self.device, non_blocking=True)
+        return self._normalize(batch).to(self.dtype, memory_format=self._memory_format)
 
-    def predict_batch(self, image_paths: list[Path | str], threshold: float = 0.5) -> list[Tuple]:
+    def predict_batch(
+        self, image_paths: list[Path | str], threshold: float = 0.5, batch_size: int = 16
+    ) -> list[Tuple]:
         """
         Predict for multiple images.
 
+        Images are stacked into mini-batches so each chunk needs a single forward
+        pass and a single device-to-host copy. The next chunk is read and
+        preprocessed on the CPU while the GPU runs the current one.
+
         Args:
             image_paths: List of image paths
             threshold: Threshold for binary mask
+            batch_size: Number of images per forward pass
 
         Returns:
-            List of prediction tuples
+            List of prediction tuples (None for images that could not be read)
         """
-        results = []
-        for image_path in image_paths:
-            try:
-                result = self.predict(image_path, threshold)
-                results.append(result)
-            except Exception as e:
-                print(f"Error processing {image_path}: {e}")
-                results.append(None)
+        results: list[Tuple | None] = [None] * len(image_paths)
+        pending = None
+        for start in range(0, len(image_paths), batch_size):
+            indices, images, tensors = [], [], []
+            for idx in range(start, min(start + batch_size, len(image_paths))):
+                try:
+                    rgb_resized, image_tensor = self._prepare(image_paths[idx])
+                except Exception as e:
+                    print(f"Error processing {image_paths[idx]}: {e}")
+                    continue
+                indices.append(idx)
+                images.append(rgb_resized)
+                tensors.append(image_tensor)
+
+            # The previous chunk's outputs (possibly the CUDA graph's static buffer)
+            # must be consumed before the next forward pass is launched
+            if pending is not None:
+                self._collect_batch(*pending, threshold, results)
+                pending = None
+            if tensors:
+                logits = self._forward(self._upload_batch(tensors))
+                pending = (indices, images, logits)
+
+        if pending is not None:
+            self._collect_batch(*pending, threshold, results)
         return results
+
+    def _collect_batch(
+        self,
+        indices: list[int],
+        images: list[np.ndarray],
+        logits: torch.Tensor,
+        threshold: float,
+        results: list[Tuple | None],
+    ) -> None:
+        """Postprocess one chunk of logits and store its predictions in ``results``."""
+        probs, binaries = self._postprocess(logits, threshold)
+        for i, idx in enumerate(indices):
+            results[idx] = (images[i], probs[i], binaries[i])
@@ -1,7 +1,12 @@
 """Metrics for segmentation evaluation."""
 
+from typing import Dict, Tuple
+
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
+
+METRIC_NAMES = ("dice", "iou", "sensitivity", "specificity", "accuracy")
 
 
 class DiceLoss(nn.Module):
@@ -21,18 +26,32 @@ class DiceLoss(nn.Module):
         """
         Calculate Dice loss.
 
+        Dice is computed per sample and then averaged, so small lesions weigh as
+        much as large ones.
+
         Args:
-            y_pred_prob: Predicted probabilities
-            y_true: Ground truth labels
+            y_pred_prob: Predicted probabilities of shape (N, ...)
+            y_true: Ground truth labels of the same shape
 
         Returns:
             Dice loss value
         """
-        y_pred = y_pred_prob.view(-1)
-        y_true = y_true.view(-1)
-        intersection = (y_pred * y_true).sum()
-        dice = (2.0 * intersection + self.smooth) / (y_pred.sum() + y_true.sum() + self.smooth)
-        return 1 - dice
+        dims = tuple(range(1, y_pred_prob.dim()))
+        intersection = (y_pred_prob * y_true).sum(dim=dims)
+        denominator = y_pred_prob.sum(dim=dims) + y_true.sum(dim=dims)
+        dice = (2.0 * intersection + self.smooth) / (denominator + self.smooth)
+        return 1 - dice.mean()
+
+
+@torch.jit.script
+def _bce_with_probs(
+    y_pred_logits: torch.Tensor, y_true: torch.Tensor
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    # log(1 - sigmoid(x)) == log(sigmoid(x)) - x, so one logsigmoid pass yields
+    # a stable BCE and the probabilities the Dice term needs
+    log_prob = F.logsigmoid(y_pred_logits)
+    bce = -(y_true * log_prob + (1.0 - y_true) * (log_prob - y_pred_logits)).mean()
+    return bce, log_prob.exp()
 
 
 class CombinedLoss(nn.Module):
@@ -41,7 +60,6 @@ class CombinedLoss(nn.Module):
     def __init__(self):
         """Initialize combined loss with BCE and Dice components."""
         super().__init__()
-        self.bce = nn.BCEWithLogitsLoss()
         self.dice = DiceLoss()
 
     def forward(self, y_pred_logits: torch.Tensor, y_true: torch.Tensor) -> torch.Tensor:
@@ -55,17 +73,114 @@ class CombinedLoss(nn.Module):
         Returns:
             Combined loss value
         """
-        prob = torch.sigmoid(y_pred_logits)
-        return 0.5 * self.bce(y_pred_logits, y_true) + 0.5 * self.dice(prob, y_true)
+        bce, prob = _bce_with_probs(y_pred_logits, y_true)
+        return 0.5 * bce + 0.5 * self.dice(prob, y_true)
+
+
+def _binarize(
+    y_pred_prob: torch.Tensor, y_true: torch.Tensor, threshold: float = 0.5
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    # Boolean masks let the metrics use cheap bitwise ops instead of float multiplies
+    return y_pred_prob > threshold, y_true > 0.5
+
+
+def confusion_counts(
+    y_pred_prob: torch.Tensor, y_true: torch.Tensor, threshold: float = 0.5
+) -> torch.Tensor:
+    """
+    Count pixel-level true/false positives and negatives.
+
+    The counts are exact integers, so tallies from many batches can be summed
+    and the metrics derived once from the totals.
+
+    Args:
+        y_pred_prob: Predicted probabilities (or logits with ``threshold=0.0``)
+        y_true: Binary ground truth labels
+        threshold: Threshold for the predicted mask
+
+    Returns:
+        Int64 tensor ``[tp, fp, fn, tn]`` on the input device
+    """
+    y_pred, target = _binarize(y_pred_prob, y_true, threshold)
+    tp = (y_pred & target).sum()
+    fp = y_pred.sum() - tp
+    fn = target.sum() - tp
+    tn = target.numel() - tp - fp - fn
+    return torch.stack([tp, fp, fn, tn])
+
+
+def metrics_from_counts(counts: torch.Tensor, smooth: float = 1e-6) -> torch.Tensor:
+    """
+    Derive all segmentation metrics from confusion counts.
+
+    Args:
+        counts: Tensor ``[tp, fp, fn, tn]`` as returned by ``confusion_counts``
+        smooth: Smoothing factor for Dice and IoU
+
+    Returns:
+        Float64 tensor of metrics on the input device, ordered as ``METRIC_NAMES``
+    """
+    tp, fp, fn, tn = counts.double().unbind()
+    actual_positives = tp + fn
+    actual_negatives = tn + fp
+    zero = torch.zeros_like(tp)
+
+    dice = (2.0 * tp + smooth) / (2.0 * tp + fp + fn + smooth)
+    iou = (tp + smooth) / (tp + fp + fn + smooth)
+    sensitivity = torch.where(actual_positives > 0, tp / actual_positives.clamp(min=1), zero)
+    specificity = torch.where(actual_negatives > 0, tn / actual_negatives.clamp(min=1), zero)
+    accuracy = (tp + tn) / (actual_positives + actual_negatives).clamp(min=1)
+    return torch.stack([dice, iou, sensitivity, specificity, accuracy])
+
+
+def metrics_tensor(
+    y_pred_prob: torch.Tensor, y_true: torch.Tensor, threshold: float = 0.5, smooth: float = 1e-6
+) -> torch.Tensor:
+    """
+    Calculate all segmentation metrics from one set of confusion counts.
+
+    The prediction is thresholded once and the metrics are derived from shared
+    TP/FP/FN/TN counts, so nothing is synchronized with the device.
+
+    Args:
+        y_pred_prob: Predicted probabilities (or logits with ``threshold=0.0``)
+        y_true: Binary ground truth labels
+        threshold: Threshold for the predicted mask
+        smooth: Smoothing factor for Dice and IoU
+
+    Returns:
+        Tensor of metrics on the input device, ordered as ``METRIC_NAMES``
+    """
+    counts = confusion_counts(y_pred_prob, y_true, threshold)
+    return metrics_from_counts(counts, smooth).float()
+
+
+def compute_metrics(
+    y_pred_prob: torch.Tensor, y_true: torch.Tensor, threshold: float = 0.5, smooth: float = 1e-6
+) -> Dict[str, float]:
+    """
+    Calculate all segmentation metrics with a single device-to-host copy.
+
+    Args:
+        y_pred_prob: Predicted probabilities
+        y_true: Binary ground truth labels
+        threshold: Threshold for the predicted mask
+        smooth: Smoothing factor for Dice and IoU
+
+    Returns:
+        Dictionary mapping each name in ``METRIC_NAMES`` to its value
+    """
+    values = metrics_tensor(y_pred_prob, y_true, threshold, smooth).tolist()
+    return dict(zip(METRIC_NAMES, values))
 
 
 def calculate_dice_score(
     y_pred_prob: torch.Tensor, y_true: torch.Tensor, smooth: float = 1e-6
 ) -> float:
     """Calculate Dice coefficient."""
-    y_pred = (y_pred_prob > 0.5).float()
-    intersection = (y_pred * y_true).sum()
-    dice = (2.0 * intersection + smooth) / (y_pred.sum() + y_true.sum() + smooth)
+    y_pred, target = _binarize(y_pred_prob, y_true)
+    intersection = (y_pred & target).sum()
+    dice = (2.0 * intersection + smooth) / (y_pred.sum() + target.sum() + smooth)
     return dice.item()
 
 
@@ -73,18 +188,18 @@ def calculate_iou_score(
     y_pred_prob: torch.Tensor, y_true: torch.Tensor, smooth: float = 1e-6
 ) -> float:
     """Calculate IoU (Intersection over Union) score."""
-    y_pred = (y_pred_prob > 0.5).float()
-    intersection = (y_pred * y_true).sum()
-    union = y_pred.sum() + y_true.sum() - intersection
+    y_pred, target = _binarize(y_pred_prob, y_true)
+    intersection = (y_pred & target).sum()
+    union = (y_pred | target).sum()
     iou = (intersection + smooth) / (union + smooth)
     return iou.item()
 
 
 def calculate_sensitivity(y_pred_prob: torch.Tensor, y_true: torch.Tensor) -> float:
     """Calculate sensitivity (recall)."""
-    y_pred = (y_pred_prob > 0.5).float()
-    true_positives = (y_pred * y_true).sum()
-    actual_positives = y_true.sum()
+    y_pred, target = _binarize(y_pred_prob, y_true)
+    true_positives = (y_pred & target).sum()
+    actual_positives = target.sum()
     if actual_positives == 0:
         return 0.0
     return (true_positives / actual_positives).item()
@@ -92,9 +207,9 @@ def calculate_sensitivity(y_pred_prob: torch.Tensor, y_true: torch.Tensor) -> fl
 
 def calculate_specificity(y_pred_prob: torch.Tensor, y_true: torch.Tensor) -> float:
     """Calculate specificity."""
-    y_pred = (y_pred_prob > 0.5).float()
-    true_negatives = ((1 - y_pred) * (1 - y_true)).sum()
-    actual_negatives = (1 - y_true).sum()
+    y_pred, target = _binarize(y_pred_prob, y_true)
+    true_negatives = (~y_pred & ~target).sum()
+    actual_negatives = target.numel() - target.sum()
     if actual_negatives == 0:
         return 0.0
     return (true_negatives / actual_negatives).item()
@@ -102,6 +217,6 @@ def calculate_specificity(y_pred_prob: torch.Tensor, y_true: torch.Tensor) -> fl
 
 def calculate_accuracy(y_pred_prob: torch.Tensor, y_true: torch.Tensor) -> float:
     """Calculate pixel-wise accuracy."""
-    y_pred = (y_pred_prob > 0.5).float()
-    accuracy = (y_pred == y_true).float().mean()
+    y_pred, target = _binarize(y_pred_prob, y_true)
+    accuracy = (y_pred == target).float().mean()
     return accuracy.item()
@@ -4,9 +4,8 @@ from pathlib import Path
 
 import mlflow
 import mlflow.pytorch
-import torch
 
-from brain_stroke_segmentation.model import build_model
+from brain_stroke_segmentation.model import build_model, load_state_dict
 
 
 def register_model_for_serving(
@@ -26,18 +25,8 @@ def register_model_for_serving(
     """
     model_path = Path(model_path)
 
-    model = build_model(encoder_name=encoder_name)
-    state_dict = torch.load(model_path, map_location="cpu")
-    # Handle both .pth (state_dict) and legacy .ckpt (Lightning format)
-    if isinstance(state_dict, dict) and "state_dict" in state_dict:
-        # Legacy Lightning checkpoint format
-        state_dict = state_dict["state_dict"]
-        # Remove 'model.' prefix if present
-        if any(k.startswith("model.") for k in state_dict.keys()):
-            state_dict = {
-                k.replace("model.", ""): v for k, v in state_dict.items() if k.startswith("model.")
-            }
-    model.load_state_dict(state_dict)
+    model = build_model(encoder_name=encoder_name, encoder_weights=None)
+    model.load_state_dict(load_state_dict(model_path))
     model.eval()
 
     mlflow.set_tracking_uri("http://127.0.0.1:8080")
@@ -1,8 +1,12 @@
 """Model definitions."""
 
+import functools
 import os
+import pickle
+from pathlib import Path
 
 import segmentation_models_pytorch as smp
+import torch
 
 # Set environment variable to avoid torchvision nms issues during model building
 # This helps when loading pretrained encoder weights
@@ -10,7 +14,7 @@ os.environ.setdefault("TORCHVISION_OPS_USE_CUDA", "0")
 
 
 def build_model(
-    encoder_name: str = "efficientnet-b4", encoder_weights: str = "imagenet"
+    encoder_name: str = "efficientnet-b4", encoder_weights: str | None = "imagenet"
 ) -> smp.Unet:
     """
     Build U-Net model for segmentation.
@@ -47,3 +51,66 @@ def build_model(
         else:
             raise
     return model
+
+
+def load_state_dict(model_path: Path | str) -> dict:
+    """
+    Load trained weights as a plain model state dict.
+
+    Loaded checkpoints are cached per file and modification time, so building
+    several inference objects in one process reads the file only once. Each call
+    returns a new dict, but the tensors are shared with the cache and must not be
+    modified in place.
+
+    Args:
+        model_path: Path to model weights (.pth state dict or legacy Lightning .ckpt)
+
+    Returns:
+        State dict with keys matching the U-Net returned by ``build_model``
+    """
+    model_path = Path(model_path).resolve()
+    return dict(_load_state_dict_cached(str(model_path), model_path.stat().st_mtime_ns))
+
+
+def normalize_checkpoint(model_path: Path | str, output_path: Path | str) -> None:
+    """
+    Rewrite a checkpoint as a plain state dict for fast loading.
+
+    Legacy Lightning wrappers and ``model.`` prefixes are stripped once, so
+    inference can memory-map the result with ``weights_only=True`` and load it
+    strictly without any key processing.
+
+    Args:
+        model_path: Path to model weights (.pth state dict or legacy Lightning .ckpt)
+        output_path: Path to save the normalized state dict
+    """
+    state_dict = {k: v.contiguous() for k, v in load_state_dict(model_path).items()}
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    torch.save(state_dict, output_path)
+    print(f"Normalized checkpoint saved to {output_path}")
+
+
+@functools.lru_cache(maxsize=4)
+def _load_state_dict_cached(model_path: str, mtime_ns: int) -> dict:
+    # mtime_ns is only part of the cache key so rewritten checkpoints are reloaded
+    try:
+        state_dict = torch.load(model_path, map_location="cpu", weights_only=True, mmap=True)
+    except TypeError:
+        # Fallback for older PyTorch versions that don't support weights_only/mmap
+        print(f"Warning: Loading {model_path} without weights_only (unsupported by PyTorch)")
+        state_dict = torch.load(model_path, map_location="cpu")
+    except pickle.UnpicklingError as e:
+        # Legacy checkpoints pickle extra objects that weights_only refuses
+        print(f"Warning: Loading {model_path} with full unpickling ({e})")
+        state_dict = torch.load(model_path, map_location="cpu", weights_only=False)
+
+    # Handle both .pth (state_dict) and .ckpt (legacy Lightning format)
+    if isinstance(state_dict, dict) and "state_dict" in state_dict:
+        state_dict = state_dict["state_dict"]
+        # Remove 'model.' prefix if present
+        if any(k.startswith("model.") for k in state_dict.keys()):
+            state_dict = {
+                k.replace("model.", ""): v for k, v in state_dict.items() if k.startswith("model.")
+            }
+    return state_dict
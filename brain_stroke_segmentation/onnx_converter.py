@@ -5,7 +5,7 @@ from pathlib import Path
 import onnx
 import torch
 
-from brain_stroke_segmentation.model import build_model
+from brain_stroke_segmentation.model import build_model, load_state_dict
 
 
 def convert_to_onnx(
@@ -15,10 +15,15 @@ def convert_to_onnx(
     img_width: int = 256,
     encoder_name: str = "efficientnet-b4",
     opset_version: int = 18,
+    simplify: bool = True,
+    check: bool = False,
 ) -> None:
     """
     Convert PyTorch model to ONNX format.
 
+    Batch size, height and width are exported as dynamic axes, so one model
+    (and one TensorRT engine built with a shape range) serves several resolutions.
+
     Args:
         model_path: Path to PyTorch model weights (.pth file)
         output_path: Path to save ONNX model
@@ -26,22 +31,15 @@ def convert_to_onnx(
         img_width: Input image width
         encoder_name: Encoder name used in training
         opset_version: ONNX opset version
+        simplify: Simplify the exported graph with onnxsim when it is installed
+        check: Run the full ONNX checker on the saved model. This is slow for the
+            B4 encoder and mostly useful when debugging an export
     """
     model_path = Path(model_path)
     output_path = Path(output_path)
 
-    model = build_model(encoder_name=encoder_name)
-    state_dict = torch.load(model_path, map_location="cpu")
-    # Handle both .pth (state_dict) and legacy .ckpt (Lightning format)
-    if isinstance(state_dict, dict) and "state_dict" in state_dict:
-        # Legacy Lightning checkpoint format
-        state_dict = state_dict["state_dict"]
-    # Remove 'model.' prefix if present
-    if any(k.startswith("model.") for k in state_dict.keys()):
-        state_dict = {
-            k.replace("model.", ""): v for k, v in state_dict.items() if k.startswith("model.")
-        }
-    model.load_state_dict(state_dict)
+    model = build_model(encoder_name=encoder_name, encoder_weights=None)
+    model.load_state_dict(load_state_dict(model_path))
     model.eval()
 
     model = model.cpu()
@@ -57,9 +55,24 @@ def convert_to_onnx(
         do_constant_folding=True,
         input_names=["input"],
         output_names=["output"],
-        dynamic_axes={"input": {0: "batch_size"}, "output": {0: "batch_size"}},
+        dynamic_axes={
+            "input": {0: "batch_size", 2: "height", 3: "width"},
+            "output": {0: "batch_size", 2: "height", 3: "width"},
+        },
     )
 
-    onnx_model = onnx.load(str(output_path))
-    onnx.checker.check_model(onnx_model)
+    if simplify:
+        try:
+            import onnxsim
+
+            # onnxsim validates the simplified graph itself
+            simplified, ok = onnxsim.simplify(onnx.load(str(output_path)))
+            if ok:
+                onnx.save(simplified, str(output_path))
+            else:
+                print("Warning: onnxsim could not validate the simplified model, keeping original")
+        except ImportError:
+            print("onnxsim not available, skipping simplification. Install: pip install onnxsim")
+    if check:
+        onnx.checker.check_model(str(output_path))
     print(f"ONNX model saved to {output_path}")
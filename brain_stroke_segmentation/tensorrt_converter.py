@@ -2,6 +2,116 @@
 
 import subprocess
 from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    CalibrationMethod,
+    QuantFormat,
+    QuantType,
+    quantize_static,
+)
+
+from brain_stroke_segmentation.data_loader import IMAGE_EXTENSIONS
+from brain_stroke_segmentation.transforms import IMAGENET_MEAN, IMAGENET_STD
+from brain_stroke_segmentation.utils import read_resized_rgb
+
+
+class ImageCalibrationReader(CalibrationDataReader):
+    """Feed normalized image batches to ONNX Runtime static quantization."""
+
+    def __init__(
+        self,
+        image_paths: Sequence[Path | str],
+        input_name: str = "input",
+        img_height: int = 256,
+        img_width: int = 256,
+        batch_size: int = 8,
+    ):
+        """
+        Initialize reader.
+
+        Args:
+            image_paths: Calibration images
+            input_name: Name of the ONNX model input
+            img_height: Input image height
+            img_width: Input image width
+            batch_size: Number of images per calibration batch
+        """
+        self.image_paths = list(image_paths)
+        self.input_name = input_name
+        self.img_height = img_height
+        self.img_width = img_width
+        self.batch_size = batch_size
+        self._mean = np.array(IMAGENET_MEAN, dtype=np.float32).reshape(1, 3, 1, 1)
+        self._std = np.array(IMAGENET_STD, dtype=np.float32).reshape(1, 3, 1, 1)
+        self.rewind()
+
+    def _iter_batches(self):
+        for start in range(0, len(self.image_paths), self.batch_size):
+            chunk = self.image_paths[start : start + self.batch_size]
+            images = [read_resized_rgb(p, self.img_width, self.img_height) for p in chunk]
+            images = [image for image in images if image is not None]
+            if not images:
+                continue
+            batch = np.stack(images).transpose(0, 3, 1, 2).astype(np.float32) / 255.0
+            yield {self.input_name: (batch - self._mean) / self._std}
+
+    def get_next(self) -> dict | None:
+        """Return the next input feed, or None when the images are exhausted."""
+        return next(self._batches, None)
+
+    def rewind(self) -> None:
+        """Restart iteration from the first image."""
+        self._batches = self._iter_batches()
+
+
+def quantize_onnx_int8(
+    onnx_path: Path | str,
+    output_path: Path | str,
+    calibration_dir: Path | str,
+    num_images: int = 1000,
+    img_height: int = 256,
+    img_width: int = 256,
+) -> None:
+    """
+    Quantize an ONNX model to INT8 with entropy calibration.
+
+    The result uses explicit QuantizeLinear/DequantizeLinear nodes with symmetric
+    scales, which TensorRT builds into INT8 kernels directly.
+
+    Args:
+        onnx_path: Path to FP32 ONNX model
+        output_path: Path to save quantized ONNX model
+        calibration_dir: Directory searched recursively for calibration images
+        num_images: Maximum number of calibration images
+        img_height: Input image height
+        img_width: Input image width
+    """
+    calibration_dir = Path(calibration_dir)
+    image_paths = sorted(
+        p for p in calibration_dir.rglob("*") if p.suffix.lower() in IMAGE_EXTENSIONS
+    )
+    if not image_paths:
+        raise FileNotFoundError(f"No calibration images found in {calibration_dir}")
+    # Spread the subset over the sorted list so every class folder is represented
+    step = max(1, len(image_paths) // num_images)
+    image_paths = image_paths[::step][:num_images]
+
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    quantize_static(
+        str(onnx_path),
+        str(output_path),
+        ImageCalibrationReader(image_paths, img_height=img_height, img_width=img_width),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+        calibrate_method=CalibrationMethod.Entropy,
+        extra_options={"ActivationSymmetric": True, "WeightSymmetric": True},
+    )
+    print(f"INT8 ONNX model calibrated on {len(image_paths)} images saved to {output_path}")
 
 
 def convert_to_tensorrt(
@@ -9,6 +119,12 @@ def convert_to_tensorrt(
     output_path: Path | str,
     precision: str = "fp16",
     workspace_size: int = 4096,
+    img_height: int = 256,
+    img_width: int = 256,
+    max_batch_size: int = 16,
+    optimization_level: int = 5,
+    calibration_dir: Path | str | None = None,
+    num_calibration_images: int = 1000,
 ) -> None:
     """
     Convert ONNX model to TensorRT format.
@@ -18,6 +134,13 @@ def convert_to_tensorrt(
         output_path: Path to save TensorRT engine
         precision: Precision mode (fp32, fp16, int8)
         workspace_size: Workspace size in MB
+        img_height: Input image height
+        img_width: Input image width
+        max_batch_size: Largest batch the engine accepts; it is tuned for batch 1
+        optimization_level: TensorRT builder optimization level (0-5)
+        calibration_dir: Images used to calibrate INT8 scales; required for an
+            accurate ``int8`` engine
+        num_calibration_images: Maximum number of calibration images
     """
     onnx_path = Path(onnx_path)
     output_path = Path(output_path)
@@ -27,12 +150,37 @@ def convert_to_tensorrt(
 
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
+    precision_flags = [f"--{precision}"]
+    if precision == "int8":
+        if calibration_dir is not None:
+            int8_onnx_path = output_path.with_suffix(".int8.onnx")
+            quantize_onnx_int8(
+                onnx_path,
+                int8_onnx_path,
+                calibration_dir,
+                num_images=num_calibration_images,
+                img_height=img_height,
+                img_width=img_width,
+            )
+            onnx_path = int8_onnx_path
+        else:
+            print(
+                "Warning: building an INT8 engine without calibration_dir; "
+                "TensorRT will use placeholder scales and accuracy will be poor"
+            )
+        # Layers left unquantized fall back to FP16 instead of FP32
+        precision_flags.append("--fp16")
+
     cmd = [
         "trtexec",
         f"--onnx={onnx_path}",
         f"--saveEngine={output_path}",
-        f"--{precision}",
-        f"--workspace={workspace_size}",
+        *precision_flags,
+        f"--memPoolSize=workspace:{workspace_size}M",
+        f"--minShapes=input:1x3x{img_height}x{img_width}",
+        f"--optShapes=input:1x3x{img_height}x{img_width}",
+        f"--maxShapes=input:{max_batch_size}x3x{img_height}x{img_width}",
+        f"--builderOptimizationLevel={optimization_level}",
     ]
 
     try:
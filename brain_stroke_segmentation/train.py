@@ -1,80 +1,188 @@
 """Training utilities for stroke segmentation using pure PyTorch."""
 
+import contextlib
+import math
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, Optional, Tuple
 
 import mlflow
 import mlflow.pytorch
 import torch
+import torch.distributed as dist
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import DataLoader
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import DataLoader, DistributedSampler
 from tqdm import tqdm
 
-from brain_stroke_segmentation.metrics import (
-    CombinedLoss,
-    calculate_dice_score,
-    calculate_iou_score,
-    calculate_sensitivity,
-    calculate_specificity,
-)
+from brain_stroke_segmentation.dataset import CUDAPrefetcher
+from brain_stroke_segmentation.metrics import CombinedLoss, confusion_counts, metrics_from_counts
 from brain_stroke_segmentation.model import build_model
+from brain_stroke_segmentation.transforms import DeviceAugment, DeviceNormalize
 from brain_stroke_segmentation.utils import get_git_commit_id
 
 
+def _is_distributed() -> bool:
+    return dist.is_available() and dist.is_initialized()
+
+
+def _is_main_process() -> bool:
+    """Return True outside distributed training and on rank 0 within it."""
+    return not _is_distributed() or dist.get_rank() == 0
+
+
+def _epoch_stats(totals: torch.Tensor, num_batches: int) -> list[float]:
+    """Turn summed ``[loss, tp, fp, fn, tn]`` tallies into loss + ``METRIC_NAMES``."""
+    # Sum the per-rank tallies so every rank sees the same epoch metrics
+    if _is_distributed():
+        dist.all_reduce(totals, op=dist.ReduceOp.SUM)
+        num_batches *= dist.get_world_size()
+    return _stats_values(totals, num_batches)
+
+
+def _stats_values(stats: torch.Tensor, num_batches: int = 1) -> list[float]:
+    loss = stats[:1] / num_batches
+    return torch.cat([loss, metrics_from_counts(stats[1:])]).tolist()
+
+
+def _device_batches(dataloader: DataLoader, device: torch.device):
+    # On CUDA the next batch is copied on a side stream during the current step
+    return CUDAPrefetcher(dataloader, device) if device.type == "cuda" else dataloader
+
+
+def _step_stats(loss: torch.Tensor, logits: torch.Tensor, masks: torch.Tensor) -> torch.Tensor:
+    """Stack the batch loss and confusion counts on the device as ``[loss, tp, fp, fn, tn]``."""
+    with torch.no_grad():
+        # sigmoid(x) > 0.5 exactly when x > 0, so the logits are thresholded directly
+        counts = confusion_counts(logits, masks, threshold=0.0)
+        # Float64 keeps the pixel counts exact when they are summed over an epoch
+        return torch.cat([loss.detach().double().reshape(1), counts.double()])
+
+
+def _set_postfix(progress_bar: tqdm, stats: torch.Tensor, num_batches: int) -> None:
+    loss, dice, iou = _stats_values(stats, num_batches)[:3]
+    postfix = {"Loss": f"{loss:.4f}", "Dice": f"{dice:.4f}", "IoU": f"{iou:.4f}"}
+    # Redraw on tqdm's own schedule (mininterval) instead of forcing a write per refresh
+    progress_bar.set_postfix(postfix, refresh=False)
+
+
+def _save_state_dict_async(executor: ThreadPoolExecutor, model: nn.Module, path: Path) -> Future:
+    # Snapshot the weights on the CPU so training can keep updating them during the write
+    state_dict = {k: v.detach().to("cpu", copy=True) for k, v in model.state_dict().items()}
+    return executor.submit(torch.save, state_dict, path)
+
+
+def _build_optimizer(model: nn.Module, learning_rate: float, use_cuda: bool) -> optim.Optimizer:
+    # The fused implementation updates all parameters in a single CUDA kernel;
+    # the multi-tensor (foreach) one is the next best where fusing is unsupported
+    if use_cuda:
+        try:
+            return optim.Adam(model.parameters(), lr=learning_rate, fused=True)
+        except (RuntimeError, TypeError) as e:
+            print(f"Warning: fused Adam unavailable ({e}), using the foreach implementation")
+    return optim.Adam(model.parameters(), lr=learning_rate, foreach=use_cuda)
+
+
 def train_epoch(
     model: nn.Module,
     dataloader: DataLoader,
     criterion: nn.Module,
     optimizer: optim.Optimizer,
     device: torch.device,
+    normalize: Optional[nn.Module] = None,
+    log_every_n_steps: int = 10,
+    scaler: Optional[torch.cuda.amp.GradScaler] = None,
+    scheduler: Optional[optim.lr_scheduler.LRScheduler] = None,
+    amp_dtype: Optional[torch.dtype] = None,
+    accumulation_steps: int = 1,
+    memory_format: torch.memory_format = torch.contiguous_format,
+    augment: Optional[nn.Module] = None,
 ) -> Tuple[float, float, float]:
     """
     Train for one epoch.
 
+    Losses and metrics are summed on the device and copied to the host only when
+    the progress bar is refreshed and at the end of the epoch. The progress bar
+    shows averages over the steps since its previous refresh.
+
     Args:
         model: Model to train
         dataloader: Training dataloader
         criterion: Loss function
         optimizer: Optimizer
         device: Device to run on
+        normalize: Optional on-device normalization for uint8 image batches
+        log_every_n_steps: Refresh the progress bar every N steps
+        scaler: Gradient scaler for FP16 training (not needed for BF16)
+        scheduler: Learning rate scheduler stepped after every optimizer step
+        amp_dtype: Autocast dtype for the forward pass, or None to run in FP32
+        accumulation_steps: Number of batches whose gradients are accumulated before
+            each optimizer step
+        memory_format: Memory format of the input batches, matching the model's
+        augment: Optional on-device augmentation applied to images and masks before
+            normalization
 
     Returns:
-        Tuple of (average_loss, average_dice, average_iou)
+        Tuple of (average_loss, dice, iou); metrics are computed from epoch-wide pixel counts
     """
     model.train()
-    running_loss = running_dice = running_iou = 0.0
-    progress_bar = tqdm(dataloader, desc="Training")
+    totals = torch.zeros(5, device=device, dtype=torch.float64)
+    # Tallies since the last progress bar refresh, shown as a running average
+    window = torch.zeros_like(totals)
+    window_steps = 0
+    progress_bar = tqdm(
+        _device_batches(dataloader, device), desc="Training", disable=not _is_main_process()
+    )
+    num_batches = len(dataloader)
 
+    optimizer.zero_grad(set_to_none=True)
     for batch_idx, (images, masks) in enumerate(progress_bar):
-        images = images.to(device)
-        masks = masks.unsqueeze(1).to(device)
-
-        logits = model(images)
-        loss = criterion(logits, masks)
-
-        optimizer.zero_grad()
-        loss.backward()
-        optimizer.step()
-
-        probs = torch.sigmoid(logits)
-        dice_score = calculate_dice_score(probs, masks)
-        iou_score = calculate_iou_score(probs, masks)
-
-        running_loss += loss.item()
-        running_dice += dice_score
-        running_iou += iou_score
-
-        progress_bar.set_postfix(
-            {
-                "Loss": f"{loss.item():.4f}",
-                "Dice": f"{dice_score:.4f}",
-                "IoU": f"{iou_score:.4f}",
-            }
-        )
-
-    N = len(dataloader)
-    return running_loss / N, running_dice / N, running_iou / N
+        # No-op for prefetched batches; asynchronous copy from pinned memory otherwise
+        images = images.to(device, non_blocking=True)
+        masks = masks.to(device, non_blocking=True).unsqueeze(1)
+        if augment is not None:
+            images, masks = augment(images, masks)
+        if normalize is not None:
+            images = normalize(images)
+        images = images.contiguous(memory_format=memory_format)
+
+        should_step = (batch_idx + 1) % accumulation_steps == 0 or batch_idx + 1 == num_batches
+        # DDP only needs to all-reduce gradients on the backward pass before a step
+        ddp_model = getattr(model, "_orig_mod", model)
+        skip_sync = isinstance(ddp_model, DistributedDataParallel) and not should_step
+        with ddp_model.no_sync() if skip_sync else contextlib.nullcontext():
+            with torch.autocast(device.type, dtype=amp_dtype, enabled=amp_dtype is not None):
+                logits = model(images)
+            # The loss is computed in FP32 so logsigmoid does not lose precision
+            logits = logits.float()
+            loss = criterion(logits, masks)
+            backward_loss = loss / accumulation_steps
+            if scaler is not None:
+                backward_loss = scaler.scale(backward_loss)
+            backward_loss.backward()
+
+        if should_step:
+            if scaler is not None:
+                scaler.step(optimizer)
+                scaler.update()
+            else:
+                optimizer.step()
+            optimizer.zero_grad(set_to_none=True)
+            if scheduler is not None:
+                scheduler.step()
+
+        stats = _step_stats(loss, logits, masks)
+        totals += stats
+        window += stats
+        window_steps += 1
+        if (batch_idx + 1) % log_every_n_steps == 0:
+            _set_postfix(progress_bar, window, window_steps)
+            window.zero_()
+            window_steps = 0
+
+    loss, dice, iou = _epoch_stats(totals, num_batches)[:3]
+    return loss, dice, iou
 
 
 def validate_epoch(
@@ -82,65 +190,66 @@ def validate_epoch(
     dataloader: DataLoader,
     criterion: nn.Module,
     device: torch.device,
+    normalize: Optional[nn.Module] = None,
+    log_every_n_steps: int = 10,
+    amp_dtype: Optional[torch.dtype] = None,
+    memory_format: torch.memory_format = torch.contiguous_format,
 ) -> Tuple[float, float, float, float, float, float]:
     """
     Validate for one epoch.
 
+    Losses and metrics are summed on the device and copied to the host only when
+    the progress bar is refreshed and at the end of the epoch. The progress bar
+    shows averages over the steps since its previous refresh.
+
     Args:
         model: Model to validate
         dataloader: Validation dataloader
         criterion: Loss function
         device: Device to run on
+        normalize: Optional on-device normalization for uint8 image batches
+        log_every_n_steps: Refresh the progress bar every N steps
+        amp_dtype: Autocast dtype for the forward pass, or None to run in FP32
+        memory_format: Memory format of the input batches, matching the model's
 
     Returns:
-        Tuple of (loss, dice, iou, sensitivity, specificity, accuracy)
+        Tuple of (loss, dice, iou, sensitivity, specificity, accuracy); metrics are
+            computed from epoch-wide pixel counts
     """
     model.eval()
-    running_loss = running_dice = running_iou = 0.0
-    running_sensitivity = running_specificity = running_accuracy = 0.0
-    progress_bar = tqdm(dataloader, desc="Validation")
+    totals = torch.zeros(5, device=device, dtype=torch.float64)
+    # Tallies since the last progress bar refresh, shown as a running average
+    window = torch.zeros_like(totals)
+    window_steps = 0
+    progress_bar = tqdm(
+        _device_batches(dataloader, device), desc="Validation", disable=not _is_main_process()
+    )
+    num_batches = len(dataloader)
 
     with torch.no_grad():
-        for images, masks in progress_bar:
-            images = images.to(device)
-            masks = masks.unsqueeze(1).to(device)
-
-            logits = model(images)
+        for batch_idx, (images, masks) in enumerate(progress_bar):
+            # No-op for prefetched batches; asynchronous copy from pinned memory otherwise
+            images = images.to(device, non_blocking=True)
+            if normalize is not None:
+                images = normalize(images)
+            images = images.contiguous(memory_format=memory_format)
+            masks = masks.to(device, non_blocking=True).unsqueeze(1)
+
+            with torch.autocast(device.type, dtype=amp_dtype, enabled=amp_dtype is not None):
+                logits = model(images)
+            logits = logits.float()
             loss = criterion(logits, masks)
 
-            probs = torch.sigmoid(logits)
-            dice_score = calculate_dice_score(probs, masks)
-            iou_score = calculate_iou_score(probs, masks)
-            sensitivity = calculate_sensitivity(probs, masks)
-            specificity = calculate_specificity(probs, masks)
+            stats = _step_stats(loss, logits, masks)
+            totals += stats
+            window += stats
+            window_steps += 1
+            if (batch_idx + 1) % log_every_n_steps == 0:
+                _set_postfix(progress_bar, window, window_steps)
+                window.zero_()
+                window_steps = 0
 
-            pred_binary = (probs > 0.5).float()
-            accuracy = (pred_binary == masks).float().mean().item()
-
-            running_loss += loss.item()
-            running_dice += dice_score
-            running_iou += iou_score
-            running_sensitivity += sensitivity
-            running_specificity += specificity
-            running_accuracy += accuracy
-
-            progress_bar.set_postfix(
-                {
-                    "Loss": f"{loss.item():.4f}",
-                    "Dice": f"{dice_score:.4f}",
-                    "IoU": f"{iou_score:.4f}",
-                }
-            )
-
-    N = len(dataloader)
-    return (
-        running_loss / N,
-        running_dice / N,
-        running_iou / N,
-        running_sensitivity / N,
-        running_specificity / N,
-        running_accuracy / N,
-    )
+    return tuple(_epoch_stats(totals, num_batches))
 
 
 def train_model(
@@ -155,10 +264,23 @@ def train_model(
     device: Optional[torch.device] = None,
     mlflow_uri: Optional[str] = None,
     log_every_n_steps: int = 10,
+    use_amp: bool = True,
+    amp_dtype: str = "float16",
+    lr_schedule: str = "plateau",
+    accumulation_steps: int = 1,
+    compile_model: bool = False,
+    compile_mode: str = "max-autotune",
+    channels_last: bool = True,
+    gpu_augment: bool = False,
 ) -> Tuple[nn.Module, Dict]:
     """
     Train the model using pure PyTorch.
 
+    When a process group is initialized (e.g. under ``torchrun``), the model is
+    wrapped in DistributedDataParallel, epoch tallies are summed over all ranks,
+    and only rank 0 prints, logs to MLflow and writes checkpoints. The loaders are
+    expected to use a ``DistributedSampler`` for the training split.
+
     Args:
         train_loader: Training dataloader
         val_loader: Validation dataloader
@@ -170,29 +292,108 @@ def train_model(
         checkpoint_dir: Directory to save checkpoints
         device: Device to run on (auto-detect if None)
         mlflow_uri: MLflow tracking URI (optional)
-        log_every_n_steps: Log every N steps
+        log_every_n_steps: Refresh the progress bars every N steps
+        use_amp: Train with mixed precision (CUDA only)
+        amp_dtype: ``"float16"`` (with a gradient scaler) or ``"bfloat16"``, which
+            keeps the FP32 exponent range and needs no loss scaling
+        lr_schedule: ``"plateau"`` to halve the rate when validation Dice stalls,
+            ``"onecycle"`` for a per-step one-cycle cosine schedule peaking at 10x
+            ``learning_rate``, or ``"cosine"`` for a one-epoch linear warmup to
+            ``learning_rate`` followed by per-step cosine decay
+        accumulation_steps: Number of batches accumulated per optimizer step; the
+            effective batch size is ``batch_size * accumulation_steps`` (per GPU)
+        compile_model: Compile the model with ``torch.compile`` (TorchInductor)
+        compile_mode: ``torch.compile`` mode; ``"max-autotune"`` benchmarks kernel
+            variants for the fixed input shape at the cost of a longer first epoch
+        channels_last: Keep the model and input batches in NHWC layout, which Tensor
+            Core convolutions prefer (CUDA only)
+        gpu_augment: Run the training augmentations on the device with
+            ``DeviceAugment``; the training dataset must then be built without CPU
+            augmentations
 
     Returns:
         Tuple of (best_model, history_dict)
     """
+    if amp_dtype not in ("float16", "bfloat16"):
+        raise ValueError(f"Unknown amp_dtype: {amp_dtype} (expected float16 or bfloat16)")
     if device is None:
         device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-
-    print(f"Using device: {device}")
-    print("Building model...")
+    distributed = _is_distributed()
+    is_main = _is_main_process()
+
+    def log(*args, **kwargs) -> None:
+        if is_main:
+            print(*args, **kwargs)
+
+    use_cuda = device.type == "cuda"
+    memory_format = torch.channels_last if channels_last and use_cuda else torch.contiguous_format
+    if use_cuda:
+        # Input shapes are fixed, so cuDNN can benchmark and cache the fastest algorithms
+        torch.backends.cudnn.benchmark = True
+        # Allow TF32 for the remaining FP32 matmuls/convs on Ampere and newer GPUs
+        torch.set_float32_matmul_precision("high")
+
+    log(f"Using device: {device}")
+    log("Building model...")
     model = build_model(encoder_name=encoder_name, encoder_weights=encoder_weights)
-    model = model.to(device)
-    print("\nModel built successfully!")
-    print(f"Total parameters: {sum(p.numel() for p in model.parameters()):,}")
-    print(
+    model = model.to(device, memory_format=memory_format)
+    raw_model = model
+    if distributed:
+        # Gradient all-reduce overlaps with the backward pass
+        device_ids = [device.index] if device.type == "cuda" else None
+        model = DistributedDataParallel(model, device_ids=device_ids)
+    if compile_model:
+        try:
+            # Compiling the DDP wrapper lets the graph break at gradient bucket boundaries
+            # so the all-reduce still overlaps. Shapes are fixed (drop_last, constant
+            # image size), so specialize on them
+            model = torch.compile(model, mode=compile_mode, dynamic=False)
+        except Exception as e:
+            log(f"Warning: torch.compile failed ({e}), training in eager mode")
+    log("\nModel built successfully!")
+    log(f"Total parameters: {sum(p.numel() for p in model.parameters()):,}")
+    log(
         f"Trainable parameters: {sum(p.numel() for p in model.parameters() if p.requires_grad):,}"
     )
 
+    use_amp = use_amp and use_cuda
+    autocast_dtype = getattr(torch, amp_dtype) if use_amp else None
+    scaler = torch.cuda.amp.GradScaler() if autocast_dtype == torch.float16 else None
+
     criterion = CombinedLoss()
-    optimizer = optim.Adam(model.parameters(), lr=learning_rate)
-    scheduler = optim.lr_scheduler.ReduceLROnPlateau(
-        optimizer, mode="max", factor=0.5, patience=8, min_lr=1e-7
-    )
+    normalize = DeviceNormalize().to(device)
+    augment = DeviceAugment().to(device) if gpu_augment else None
+    optimizer = _build_optimizer(model, learning_rate, use_cuda)
+    steps_per_epoch = math.ceil(len(train_loader) / accumulation_steps)
+    total_steps = epochs * steps_per_epoch
+    plateau_scheduler = None
+    if lr_schedule == "onecycle":
+        step_scheduler = optim.lr_scheduler.OneCycleLR(
+            optimizer,
+            max_lr=learning_rate * 10,
+            total_steps=total_steps,
+            anneal_strategy="cos",
+        )
+    elif lr_schedule == "cosine":
+        warmup_steps = steps_per_epoch
+        warmup = optim.lr_scheduler.LinearLR(
+            optimizer,
+            start_factor=0.01,
+            total_iters=warmup_steps,
+        )
+        decay = optim.lr_scheduler.CosineAnnealingLR(
+            optimizer, T_max=max(total_steps - warmup_steps, 1), eta_min=1e-7
+        )
+        step_scheduler = optim.lr_scheduler.SequentialLR(
+            optimizer, schedulers=[warmup, decay], milestones=[warmup_steps]
+        )
+    elif lr_schedule == "plateau":
+        step_scheduler = None
+        plateau_scheduler = optim.lr_scheduler.ReduceLROnPlateau(
+            optimizer, mode="max", factor=0.5, patience=8, min_lr=1e-7
+        )
+    else:
+        raise ValueError(f"Unknown lr_schedule: {lr_schedule}")
 
     history = {
         "train_loss": [],
@@ -212,10 +413,13 @@ def train_model(
 
     best_dice = 0.0
     patience_counter = 0
+    # Checkpoints are written by a background thread on rank 0 while training continues
+    save_executor = ThreadPoolExecutor(max_workers=1) if is_main else None
+    pending_save = None
 
     # Setup MLflow if URI provided
     mlflow_active = False
-    if mlflow_uri:
+    if mlflow_uri and is_main:
         try:
             mlflow.set_tracking_uri(mlflow_uri)
             experiment = mlflow.get_experiment_by_name("brain_stroke_segmentation")
@@ -233,29 +437,60 @@ def train_model(
                     "learning_rate": learning_rate,
                     "epochs": epochs,
                     "patience": patience,
+                    "amp": use_amp,
+                    "amp_dtype": amp_dtype if use_amp else None,
+                    "lr_schedule": lr_schedule,
+                    "accumulation_steps": accumulation_steps,
+                    "compile": compile_model,
+                    "channels_last": memory_format == torch.channels_last,
+                    "gpu_augment": gpu_augment,
                     "git_commit_id": git_commit,
                 }
             )
-            print("MLflow logging enabled")
+            log("MLflow logging enabled")
         except Exception as e:
-            print(f"MLflow not available ({e}), continuing without MLflow")
+            log(f"MLflow not available ({e}), continuing without MLflow")
             mlflow_active = False
 
-    print("Starting training...")
-    print("=" * 50)
+    log("Starting training...")
+    log("=" * 50)
 
     for epoch in range(epochs):
-        print(f"\nEpoch {epoch+1}/{epochs}")
-        print("-" * 30)
+        if isinstance(train_loader.sampler, DistributedSampler):
+            train_loader.sampler.set_epoch(epoch)
+        log(f"\nEpoch {epoch+1}/{epochs}")
+        log("-" * 30)
 
         train_loss, train_dice, train_iou = train_epoch(
-            model, train_loader, criterion, optimizer, device
+            model,
+            train_loader,
+            criterion,
+            optimizer,
+            device,
+            normalize,
+            log_every_n_steps,
+            scaler,
+            step_scheduler,
+            autocast_dtype,
+            accumulation_steps,
+            memory_format,
+            augment,
         )
         val_loss, val_dice, val_iou, val_sensitivity, val_specificity, val_accuracy = (
-            validate_epoch(model, val_loader, criterion, device)
+            validate_epoch(
+                model,
+                val_loader,
+                criterion,
+                device,
+                normalize,
+                log_every_n_steps,
+                autocast_dtype,
+                memory_format,
+            )
         )
 
-        scheduler.step(val_dice)
+        if plateau_scheduler is not None:
+            plateau_scheduler.step(val_dice)
 
         history["train_loss"].append(train_loss)
         history["val_loss"].append(val_loss)
@@ -267,13 +502,13 @@ def train_model(
         history["val_specificity"].append(val_specificity)
         history["val_accuracy"].append(val_accuracy)
 
-        print(
+        log(
             f"Train Loss: {train_loss:.4f}, Train Dice: {train_dice:.4f}, "
             f"Train IoU: {train_iou:.4f}"
         )
-        print(f"Val   Loss: {val_loss:.4f}, Val   Dice: {val_dice:.4f}, Val   IoU: {val_iou:.4f}")
-        print(f"Val Sensitivity: {val_sensitivity:.4f}, Val Specificity: {val_specificity:.4f}")
-        print(f"Val Accuracy: {val_accuracy:.4f}")
+        log(f"Val   Loss: {val_loss:.4f}, Val   Dice: {val_dice:.4f}, Val   IoU: {val_iou:.4f}")
+        log(f"Val Sensitivity: {val_sensitivity:.4f}, Val Specificity: {val_specificity:.4f}")
+        log(f"Val Accuracy: {val_accuracy:.4f}")
 
         # Log to MLflow
         if mlflow_active:
@@ -293,25 +528,34 @@ def train_model(
                     step=epoch,
                 )
             except Exception as e:
-                print(f"Warning: MLflow logging failed: {e}")
+                log(f"Warning: MLflow logging failed: {e}")
 
         # Save best model
         if val_dice > best_dice:
             best_dice = val_dice
-            torch.save(model.state_dict(), best_model_path)
-            print(f"New best model saved! Dice: {best_dice:.4f}")
+            if is_main:
+                if pending_save is not None:
+                    pending_save.result()
+                pending_save = _save_state_dict_async(save_executor, raw_model, best_model_path)
+            log(f"New best model saved! Dice: {best_dice:.4f}")
             patience_counter = 0
         else:
             patience_counter += 1
 
         # Early stopping
         if patience_counter >= patience:
-            print(f"Early stopping triggered after {epoch+1} epochs")
+            log(f"Early stopping triggered after {epoch+1} epochs")
             break
 
     # Load best model
-    model.load_state_dict(torch.load(best_model_path))
-    print(f"\nTraining completed! Best Dice: {best_dice:.4f}")
-    print(f"Best model saved to: {best_model_path}")
-
-    return model, history
+    if save_executor is not None:
+        save_executor.shutdown(wait=True)
+        if pending_save is not None:
+            pending_save.result()
+    if distributed:
+        dist.barrier()
+    raw_model.load_state_dict(torch.load(best_model_path, map_location=device))
+    log(f"\nTraining completed! Best Dice: {best_dice:.4f}")
+    log(f"Best model saved to: {best_model_path}")
+
+    return raw_model, history
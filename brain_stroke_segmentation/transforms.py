@@ -1,33 +1,175 @@
 """Data augmentation and transforms."""
 
+import math
+
 import albumentations as A
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
 from albumentations.pytorch import ToTensorV2
 
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
 
-def get_transforms(is_training: bool = True) -> A.Compose:
+def get_transforms(
+    is_training: bool = True, normalize: bool = True, augment: bool = True
+) -> A.Compose:
     """
     Get data transforms for training or validation.
 
     Args:
         is_training: Whether to apply training augmentations
+        normalize: Whether to normalize on the CPU. When False the pipeline yields
+            uint8 tensors that are meant to be normalized on the device with
+            ``DeviceNormalize``
+        augment: Whether to run the training augmentations on the CPU. Disable it
+            when they are applied on the device with ``DeviceAugment``
 
     Returns:
         Albumentations compose object
     """
-    if is_training:
-        return A.Compose(
+    transforms = []
+    if is_training and augment:
+        transforms += [
+            A.HorizontalFlip(p=0.5),
+            A.RandomBrightnessContrast(brightness_limit=0.05, contrast_limit=0.05, p=0.3),
+            A.ShiftScaleRotate(shift_limit=0.05, scale_limit=0.05, rotate_limit=5, p=0.3),
+        ]
+    if normalize:
+        transforms.append(A.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD))
+    transforms.append(ToTensorV2())
+    return A.Compose(transforms)
+
+
+class DeviceNormalize(nn.Module):
+    """Convert uint8 image batches to normalized floats on their device."""
+
+    def __init__(self):
+        """Register ImageNet normalization folded into a single scale and shift."""
+        super().__init__()
+        mean = torch.tensor(IMAGENET_MEAN).view(1, 3, 1, 1)
+        std = torch.tensor(IMAGENET_STD).view(1, 3, 1, 1)
+        # (x / 255 - mean) / std == x * scale + shift
+        self.register_buffer("scale", 1.0 / (255.0 * std))
+        self.register_buffer("shift", -mean / std)
+
+    def forward(self, images: torch.Tensor) -> torch.Tensor:
+        """
+        Normalize an image batch.
+
+        Args:
+            images: uint8 tensor of shape (N, 3, H, W)
+
+        Returns:
+            Normalized float32 tensor
+        """
+        return torch.addcmul(self.shift, images.float(), self.scale)
+
+
+class DeviceAugment(nn.Module):
+    """
+    Apply the training augmentations of ``get_transforms`` to batches on their device.
+
+    Mirrors the CPU pipeline: horizontal flip, brightness/contrast and a small
+    shift/scale/rotate, each drawn independently per sample. Geometric transforms
+    are applied to the masks with nearest-neighbour sampling.
+    """
+
+    def __init__(
+        self,
+        flip_p: float = 0.5,
+        brightness_contrast_p: float = 0.3,
+        brightness_limit: float = 0.05,
+        contrast_limit: float = 0.05,
+        affine_p: float = 0.3,
+        shift_limit: float = 0.05,
+        scale_limit: float = 0.05,
+        rotate_limit: float = 5.0,
+    ):
+        """
+        Store the augmentation parameters.
+
+        Args:
+            flip_p: Probability of a horizontal flip
+            brightness_contrast_p: Probability of a brightness/contrast change
+            brightness_limit: Maximum brightness shift as a fraction of 255
+            contrast_limit: Maximum relative contrast change
+            affine_p: Probability of a shift/scale/rotate
+            shift_limit: Maximum shift as a fraction of the image size
+            scale_limit: Maximum relative scale change
+            rotate_limit: Maximum rotation in degrees
+        """
+        super().__init__()
+        self.flip_p = flip_p
+        self.brightness_contrast_p = brightness_contrast_p
+        self.brightness_limit = brightness_limit
+        self.contrast_limit = contrast_limit
+        self.affine_p = affine_p
+        self.shift_limit = shift_limit
+        self.scale_limit = scale_limit
+        self.rotate_limit = rotate_limit
+
+    def _uniform(self, n: int, limit: float, device: torch.device) -> torch.Tensor:
+        return (torch.rand(n, device=device) * 2 - 1) * limit
+
+    def _apply_mask(self, p: float, n: int, device: torch.device) -> torch.Tensor:
+        return torch.rand(n, device=device) < p
+
+    def _affine_grid(self, images: torch.Tensor) -> torch.Tensor:
+        n, _, height, width = images.shape
+        device = images.device
+        enabled = self._apply_mask(self.affine_p, n, device)
+        angle = self._uniform(n, math.radians(self.rotate_limit), device) * enabled
+        scale = 1 + self._uniform(n, self.scale_limit, device) * enabled
+        shift_x = self._uniform(n, self.shift_limit, device) * enabled
+        shift_y = self._uniform(n, self.shift_limit, device) * enabled
+
+        # Rotation is defined in pixel space, so normalized coordinates are
+        # corrected for the aspect ratio; shifts span 2 units in [-1, 1]
+        cos, sin = torch.cos(angle) / scale, torch.sin(angle) / scale
+        theta = torch.stack(
             [
-                A.HorizontalFlip(p=0.5),
-                A.RandomBrightnessContrast(brightness_limit=0.05, contrast_limit=0.05, p=0.3),
-                A.ShiftScaleRotate(shift_limit=0.05, scale_limit=0.05, rotate_limit=5, p=0.3),
-                A.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-                ToTensorV2(),
-            ]
+                torch.stack([cos, -sin * height / width, 2 * shift_x], dim=1),
+                torch.stack([sin * width / height, cos, 2 * shift_y], dim=1),
+            ],
+            dim=1,
         )
-    else:
-        return A.Compose(
-            [
-                A.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-                ToTensorV2(),
-            ]
+        return F.affine_grid(theta, list(images.shape), align_corners=False)
+
+    def forward(
+        self, images: torch.Tensor, masks: torch.Tensor
+    ) -> tuple[torch.Tensor, torch.Tensor]:
+        """
+        Augment an image batch and its masks.
+
+        Args:
+            images: uint8 or float tensor of shape (N, 3, H, W) with values in [0, 255]
+            masks: Float tensor of shape (N, 1, H, W)
+
+        Returns:
+            Tuple of (float32 images in [0, 255], masks)
+        """
+        images = images.float()
+        n, device = images.shape[0], images.device
+
+        flip = self._apply_mask(self.flip_p, n, device).view(n, 1, 1, 1)
+        images = torch.where(flip, images.flip(-1), images)
+        masks = torch.where(flip, masks.flip(-1), masks)
+
+        enabled = self._apply_mask(self.brightness_contrast_p, n, device)
+        alpha = 1 + self._uniform(n, self.contrast_limit, device) * enabled
+        beta = self._uniform(n, self.brightness_limit, device) * enabled * 255
+        images = images * alpha.view(n, 1, 1, 1) + beta.view(n, 1, 1, 1)
+        images = images.clamp_(0, 255)
+
+        # Samples without a geometric transform get an identity grid, which
+        # reproduces them exactly
+        grid = self._affine_grid(images)
+        images = F.grid_sample(
+            images, grid, mode="bilinear", padding_mode="reflection", align_corners=False
+        )
+        masks = F.grid_sample(
+            masks, grid, mode="nearest", padding_mode="reflection", align_corners=False
         )
+        return images, masks
@@ -1,11 +1,139 @@
 """Utility functions for brain stroke segmentation."""
 
+import functools
+import struct
 from pathlib import Path
 
 import cv2
 import numpy as np
 
 
+_REDUCED_READ_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+JPEG_MAGIC = b"\xff\xd8\xff"
+PNG_MAGIC = b"\x89PNG\r\n\x1a\n"
+# Start-of-frame markers carry the image size; C4, C8 and CC are other segments
+_JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+# Encoder settings per output format; PNG uses the fastest DEFLATE level
+IMWRITE_PARAMS = {
+    "png": [cv2.IMWRITE_PNG_COMPRESSION, 1],
+    "jpg": [cv2.IMWRITE_JPEG_QUALITY, 95],
+    "webp": [cv2.IMWRITE_WEBP_QUALITY, 90],
+}
+
+# APP segments (EXIF, ICC profiles) precede the JPEG frame header, each up to 64 KiB
+_HEADER_PEEK_BYTES = 1 << 16
+
+
+def read_resized_rgb(image_path: Path | str, width: int, height: int) -> np.ndarray | None:
+    """
+    Read an image from disk and resize it to the target size.
+
+    For JPEGs the size is peeked from the file header and the largest
+    ``IMREAD_REDUCED_COLOR_*`` factor that still covers the target size is used,
+    so libjpeg downscales while decoding. Other formats are read with
+    ``IMREAD_COLOR``: OpenCV would decode them at full size and then resize them
+    for a reduced flag, which is slower and changes the pixels.
+
+    Args:
+        image_path: Path to the image
+        width: Target width
+        height: Target height
+
+    Returns:
+        Resized uint8 RGB image or None if the file is unreadable
+    """
+    flag = cv2.IMREAD_COLOR
+    try:
+        with open(image_path, "rb") as f:
+            # Only a JPEG start-of-image marker is worth scanning for the frame header
+            header = f.read(2)
+            if header == JPEG_MAGIC[:2]:
+                header += f.read(_HEADER_PEEK_BYTES)
+    except OSError:
+        return None
+    size = image_size(header) if is_jpeg(header) else None
+    if size is not None:
+        src_width, src_height = size
+        flag = next(
+            (
+                reduced_flag
+                for factor, reduced_flag in _REDUCED_READ_FLAGS
+                if src_width // factor >= width and src_height // factor >= height
+            ),
+            cv2.IMREAD_COLOR,
+        )
+    bgr = cv2.imread(str(image_path), flag)
+    if bgr is None:
+        return None
+    return resize_bgr_to_rgb(bgr, width, height)
+
+
+def is_jpeg(data: bytes | memoryview | np.ndarray) -> bool:
+    """Return True if an encoded image buffer starts with the JPEG magic bytes."""
+    return bytes(memoryview(data)[:3]) == JPEG_MAGIC
+
+
+def image_size(data: bytes | memoryview | np.ndarray) -> tuple[int, int] | None:
+    """
+    Read the size of an encoded JPEG or PNG from its header without decoding it.
+
+    Args:
+        data: Encoded image in any buffer
+
+    Returns:
+        Tuple of (width, height), or None for other formats and malformed headers
+    """
+    try:
+        view = memoryview(data).cast("B")
+    except (TypeError, ValueError):
+        # Non-contiguous buffers cannot be viewed as flat bytes
+        return None
+    if len(view) >= 24 and bytes(view[:8]) == PNG_MAGIC and bytes(view[12:16]) == b"IHDR":
+        width, height = struct.unpack(">II", view[16:24])
+        return width, height
+    if not is_jpeg(view):
+        return None
+
+    # Walk the marker segments after SOI until the frame header
+    i = 2
+    while i + 9 <= len(view):
+        if view[i] != 0xFF:
+            return None
+        marker = view[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker in _JPEG_SOF_MARKERS:
+            height, width = struct.unpack(">HH", view[i + 5 : i + 9])
+            return width, height
+        (length,) = struct.unpack(">H", view[i + 2 : i + 4])
+        i += 2 + length
+    return None
+
+
+def resize_bgr_to_rgb(bgr: np.ndarray, width: int, height: int) -> np.ndarray:
+    """
+    Resize a decoded BGR image to the target size and convert it to RGB.
+
+    Args:
+        bgr: uint8 BGR image, e.g. from ``cv2.imread`` or ``cv2.imdecode``
+        width: Target width
+        height: Target height
+
+    Returns:
+        Resized uint8 RGB image
+    """
+    # Resize first so the channel swap only touches target-size pixels
+    bgr = cv2.resize(bgr, (width, height), interpolation=cv2.INTER_LINEAR)
+    return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+
+
 def extract_red_mask_from_path(
     mask_path: Path | str | None, width: int, height: int
 ) -> np.ndarray | None:
@@ -34,15 +162,54 @@ def extract_red_mask_from_path(
     hsv = cv2.cvtColor(overlay, cv2.COLOR_BGR2HSV)
     lower1, upper1 = np.array([0, 50, 50]), np.array([10, 255, 255])
     lower2, upper2 = np.array([170, 50, 50]), np.array([180, 255, 255])
-    mask = cv2.inRange(hsv, lower1, upper1) | cv2.inRange(hsv, lower2, upper2)
-    mask = (mask > 0).astype(np.float32)
+    mask = cv2.inRange(hsv, lower1, upper1)
+    cv2.bitwise_or(mask, cv2.inRange(hsv, lower2, upper2), dst=mask)
+    # Nearest-neighbour resizing keeps the uint8 mask binary, so it is converted once
     mask = cv2.resize(mask, (width, height), interpolation=cv2.INTER_NEAREST)
-    mask = (mask > 0.5).astype(np.float32)
-    return mask
+    return (mask > 0).astype(np.float32)
+
+
+def save_prediction_images(
+    rgb: np.ndarray,
+    prob: np.ndarray,
+    binary: np.ndarray,
+    output_dir: Path | str,
+    stem: str,
+    image_format: str = "png",
+) -> None:
+    """
+    Write the image, probability map and binary mask as separate files.
+
+    Files are named ``{stem}_orig.{ext}``, ``{stem}_prob.{ext}`` and ``{stem}_mask.png``.
+
+    Args:
+        rgb: Resized RGB image
+        prob: Probability map in [0, 1]
+        binary: Binary mask (0/255)
+        output_dir: Directory to write into
+        stem: File name prefix
+        image_format: Format of the image and probability map, one of ``IMWRITE_PARAMS``.
+            ``"jpg"`` and ``"webp"`` encode much faster than PNG but are lossy; the
+            mask is always written as lossless PNG
+    """
+    if image_format not in IMWRITE_PARAMS:
+        raise ValueError(f"Unknown image format: {image_format}")
+    output_dir = Path(output_dir)
+    params = IMWRITE_PARAMS[image_format]
+    cv2.imwrite(
+        str(output_dir / f"{stem}_orig.{image_format}"),
+        cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR),
+        params,
+    )
+    # Scale and saturate to uint8 in one pass, without a float32 temporary
+    prob_u8 = cv2.convertScaleAbs(prob, alpha=255.0)
+    cv2.imwrite(str(output_dir / f"{stem}_prob.{image_format}"), prob_u8, params)
+    cv2.imwrite(str(output_dir / f"{stem}_mask.png"), binary, IMWRITE_PARAMS["png"])
 
 
+@functools.lru_cache(maxsize=1)
 def get_git_commit_id() -> str:
-    """Get current git commit ID."""
+    """Get current git commit ID (looked up once per process)."""
     try:
         import git
 
@@ -1,9 +1,11 @@
-"""Visualization utilities for training metrics."""
+"""Visualization utilities for training metrics and predictions."""
 
 from pathlib import Path
 from typing import Dict, List
 
 import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.figure import Figure
 
 
 def plot_training_history(history: Dict[str, List[float]], output_path: Path | str = None) -> None:
@@ -72,3 +74,32 @@ def plot_training_history(history: Dict[str, List[float]], output_path: Path | s
         plt.show()
 
     plt.close()
+
+
+def save_prediction_figure(
+    rgb: np.ndarray, prob: np.ndarray, binary: np.ndarray, output_path: Path | str
+) -> None:
+    """
+    Save original image, probability map and binary mask side by side.
+
+    Uses the object-oriented Figure API instead of pyplot, so it is safe to call
+    from worker threads.
+
+    Args:
+        rgb: Resized RGB image
+        prob: Probability map
+        binary: Binary mask
+        output_path: Path to save the figure
+    """
+    fig = Figure(figsize=(15, 5))
+    axes = fig.subplots(1, 3)
+    axes[0].imshow(rgb)
+    axes[0].set_title("Original")
+    axes[0].axis("off")
+    axes[1].imshow(prob, cmap="gray")
+    axes[1].set_title("Probability")
+    axes[1].axis("off")
+    axes[2].imshow(binary, cmap="gray")
+    axes[2].set_title("Binary Mask")
+    axes[2].axis("off")
+    fig.savefig(output_path)
@@ -14,7 +14,11 @@ trtexec \
     --onnx=$ONNX_MODEL \
     --saveEngine=$OUTPUT_PATH \
     --$PRECISION \
-    --workspace=$WORKSPACE_SIZE
+    --memPoolSize=workspace:${WORKSPACE_SIZE}M \
+    --minShapes=input:1x3x256x256 \
+    --optShapes=input:1x3x256x256 \
+    --maxShapes=input:16x3x256x256 \
+    --builderOptimizationLevel=5
 
 if [ $? -eq 0 ]; then
     echo "TensorRT conversion successful. Engine saved to $OUTPUT_PATH"
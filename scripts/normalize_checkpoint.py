@@ -0,0 +1,8 @@
+"""Rewrite a trained checkpoint as a plain state dict for fast inference loading."""
+
+import fire
+
+from brain_stroke_segmentation.model import normalize_checkpoint
+
+if __name__ == "__main__":
+    fire.Fire(normalize_checkpoint)
@@ -0,0 +1,89 @@
+"""Tests for the cached dataset file index."""
+
+import os
+
+from brain_stroke_segmentation.data_loader import (
+    _index_cache_path,
+    _index_signature,
+    _read_index_cache,
+    _write_index_cache,
+    load_and_preprocess_data,
+)
+
+
+def _make_dataset(root):
+    png_dir = root / "Ischemia" / "PNG"
+    overlay_dir = root / "Ischemia" / "OVERLAY"
+    png_dir.mkdir(parents=True)
+    overlay_dir.mkdir(parents=True)
+    (png_dir / "1.png").write_bytes(b"image")
+    (overlay_dir / "1.png").write_bytes(b"overlay")
+    return png_dir
+
+
+def _touch_dir(directory):
+    stat = directory.stat()
+    os.utime(directory, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_cache_round_trip(tmp_path):
+    """Read a written index back for the same signature."""
+    dataset = tmp_path / "dataset"
+    _make_dataset(dataset)
+    cache_file = _index_cache_path(dataset)
+    signature = _index_signature(dataset)
+    images = [dataset / "Ischemia" / "PNG" / "1.png"]
+    masks = [None]
+
+    _write_index_cache(cache_file, signature, images, masks)
+
+    assert _read_index_cache(cache_file, signature) == (images, masks)
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_signature_changes_when_directory_changes(tmp_path):
+    """Change the signature when a scanned directory is touched."""
+    dataset = tmp_path / "dataset"
+    png_dir = _make_dataset(dataset)
+    signature = _index_signature(dataset)
+
+    _touch_dir(png_dir)
+
+    assert _index_signature(dataset) != signature
+
+
+def test_stale_cache_is_ignored(tmp_path):
+    """Ignore an index written for an older signature."""
+    dataset = tmp_path / "dataset"
+    png_dir = _make_dataset(dataset)
+    cache_file = _index_cache_path(dataset)
+    _write_index_cache(cache_file, _index_signature(dataset), [png_dir / "1.png"], [None])
+
+    (png_dir / "2.png").write_bytes(b"image")
+    _touch_dir(png_dir)
+
+    assert _read_index_cache(cache_file, _index_signature(dataset)) is None
+
+
+def test_corrupt_cache_is_ignored(tmp_path):
+    """Treat a truncated index file as missing."""
+    dataset = tmp_path / "dataset"
+    _make_dataset(dataset)
+    cache_file = _index_cache_path(dataset)
+    cache_file.write_text('{"signature": ')
+
+    assert _read_index_cache(cache_file, _index_signature(dataset)) is None
+
+
+def test_load_picks_up_new_files(tmp_path):
+    """Find files added after the index was cached."""
+    dataset = tmp_path / "dataset"
+    png_dir = _make_dataset(dataset)
+    images, _ = load_and_preprocess_data(dataset)
+    assert [p.name for p in images] == ["1.png"]
+
+    (png_dir / "2.png").write_bytes(b"image")
+    _touch_dir(png_dir)
+    images, _ = load_and_preprocess_data(dataset)
+
+    assert [p.name for p in images] == ["1.png", "2.png"]
@@ -0,0 +1,85 @@
+"""Tests for the memory-mapped dataset cache key."""
+
+import os
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+from brain_stroke_segmentation import dataset as dataset_module
+from brain_stroke_segmentation.dataset import StrokeDataset
+
+
+@pytest.fixture
+def sample(tmp_path):
+    """Create an image and a mask file."""
+    image = tmp_path / "image.png"
+    mask = tmp_path / "mask.png"
+    image.write_bytes(b"image")
+    mask.write_bytes(b"mask")
+    return image, mask
+
+
+def _cache_key(image, mask, img_size: int = 8):
+    dataset = StrokeDataset([image], [mask], img_height=img_size, img_width=img_size)
+    return dataset._cache_paths(Path("cache"))
+
+
+def test_key_is_stable(sample):
+    """Reuse the cache files while nothing changes."""
+    assert _cache_key(*sample) == _cache_key(*sample)
+
+
+def test_key_changes_with_file_size(sample):
+    """Invalidate the cache when a file is rewritten with a new size."""
+    image, mask = sample
+    before = _cache_key(image, mask)
+    mask.write_bytes(b"a different mask")
+
+    assert _cache_key(image, mask) != before
+
+
+def test_key_changes_with_file_mtime(sample):
+    """Invalidate the cache when a file is touched."""
+    image, mask = sample
+    before = _cache_key(image, mask)
+    stat = image.stat()
+    os.utime(image, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    assert _cache_key(image, mask) != before
+
+
+def test_key_changes_with_target_size(sample):
+    """Give each target size its own cache."""
+    assert _cache_key(*sample, img_size=8) != _cache_key(*sample, img_size=16)
+
+
+def test_key_changes_with_cache_version(sample, monkeypatch):
+    """Invalidate the cache when _CACHE_VERSION is bumped."""
+    before = _cache_key(*sample)
+    monkeypatch.setattr(dataset_module, "_CACHE_VERSION", dataset_module._CACHE_VERSION + 1)
+
+    assert _cache_key(*sample) != before
+
+
+def test_key_with_missing_mask(sample):
+    """Key samples that have no mask."""
+    image, _ = sample
+
+    assert _cache_key(image, None) == _cache_key(image, None)
+
+
+def test_cache_is_rebuilt_when_image_changes(tmp_path):
+    """Read a changed image again instead of serving it from the cache."""
+    image = tmp_path / "image.png"
+    cache_dir = tmp_path / "cache"
+    cv2.imwrite(str(image), np.full((16, 16, 3), 10, dtype=np.uint8))
+    first = StrokeDataset([image], [None], img_height=8, img_width=8, cache_dir=cache_dir)
+
+    cv2.imwrite(str(image), np.full((32, 32, 3), 200, dtype=np.uint8))
+    second = StrokeDataset([image], [None], img_height=8, img_width=8, cache_dir=cache_dir)
+
+    assert second.image_cache_file != first.image_cache_file
+    assert (first[0][0] == 10).all()
+    assert (second[0][0] == 200).all()
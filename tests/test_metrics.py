@@ -0,0 +1,78 @@
+"""Tests for confusion-count based segmentation metrics."""
+
+import pytest
+import torch
+
+from brain_stroke_segmentation.metrics import (
+    METRIC_NAMES,
+    compute_metrics,
+    confusion_counts,
+    metrics_from_counts,
+)
+
+
+def test_confusion_counts_matches_hand_count():
+    """Count TP/FP/FN/TN of a thresholded prediction."""
+    y_pred = torch.tensor([0.9, 0.8, 0.2, 0.1, 0.7, 0.3])
+    y_true = torch.tensor([1.0, 0.0, 1.0, 0.0, 1.0, 0.0])
+
+    tp, fp, fn, tn = confusion_counts(y_pred, y_true).tolist()
+
+    assert (tp, fp, fn, tn) == (2, 1, 1, 2)
+
+
+def test_confusion_counts_with_logits_threshold():
+    """Binarize logits with a threshold of 0."""
+    logits = torch.tensor([2.0, -1.0, 0.5, -3.0])
+    y_true = torch.tensor([1.0, 1.0, 0.0, 0.0])
+
+    assert confusion_counts(logits, y_true, threshold=0.0).tolist() == [1, 1, 1, 1]
+
+
+def test_counts_summed_over_batches_match_full_set():
+    """Sum per-batch counts to the counts of the whole set."""
+    generator = torch.Generator().manual_seed(0)
+    y_pred = torch.rand(4, 1, 16, 16, generator=generator)
+    y_true = (torch.rand(4, 1, 16, 16, generator=generator) > 0.7).float()
+
+    total = sum(confusion_counts(y_pred[i : i + 1], y_true[i : i + 1]) for i in range(4))
+
+    assert torch.equal(total, confusion_counts(y_pred, y_true))
+
+
+def test_metrics_from_counts_values():
+    """Derive every metric from known counts."""
+    counts = torch.tensor([30, 10, 20, 940])
+
+    metrics = dict(zip(METRIC_NAMES, metrics_from_counts(counts, smooth=0.0).tolist()))
+
+    assert metrics["dice"] == pytest.approx(60 / 90)
+    assert metrics["iou"] == pytest.approx(30 / 60)
+    assert metrics["sensitivity"] == pytest.approx(30 / 50)
+    assert metrics["specificity"] == pytest.approx(940 / 950)
+    assert metrics["accuracy"] == pytest.approx(970 / 1000)
+
+
+def test_metrics_from_counts_without_positives():
+    """Handle a sample with no positive pixels."""
+    counts = torch.tensor([0, 0, 0, 100])
+
+    metrics = dict(zip(METRIC_NAMES, metrics_from_counts(counts).tolist()))
+
+    # An empty mask predicted as empty is a perfect match, not a division by zero
+    assert metrics["dice"] == pytest.approx(1.0)
+    assert metrics["iou"] == pytest.approx(1.0)
+    assert metrics["sensitivity"] == 0.0
+    assert metrics["specificity"] == pytest.approx(1.0)
+    assert metrics["accuracy"] == pytest.approx(1.0)
+
+
+def test_compute_metrics_uses_metric_names():
+    """Key and order the metrics by METRIC_NAMES."""
+    y_pred = torch.tensor([0.9, 0.1])
+    y_true = torch.tensor([1.0, 0.0])
+
+    metrics = compute_metrics(y_pred, y_true)
+
+    assert tuple(metrics) == METRIC_NAMES
+    assert metrics["dice"] == pytest.approx(1.0)
@@ -0,0 +1,80 @@
+"""Tests for the encoded image header parser."""
+
+import struct
+
+import cv2
+import numpy as np
+import pytest
+
+from brain_stroke_segmentation.utils import JPEG_MAGIC, PNG_MAGIC, image_size, is_jpeg
+
+
+def _png_header(width: int, height: int) -> bytes:
+    ihdr = struct.pack(">II", width, height) + bytes([8, 2, 0, 0, 0])
+    return PNG_MAGIC + struct.pack(">I", len(ihdr)) + b"IHDR" + ihdr + b"\x00" * 4
+
+
+def _jpeg_header(width: int, height: int, sof_marker: int = 0xC0) -> bytes:
+    app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00" + b"\x00" * 9
+    # A Huffman table segment (C4) sits in the SOF range but carries no size
+    dht = b"\xff\xc4" + struct.pack(">H", 4) + b"\x00\x00"
+    sof = bytes([0xFF, sof_marker]) + struct.pack(">HBHHB", 11, 8, height, width, 1)
+    return b"\xff\xd8" + app0 + dht + sof + b"\x01\x11\x00"
+
+
+def test_png_size():
+    """Read the size from the PNG IHDR chunk."""
+    assert image_size(_png_header(640, 480)) == (640, 480)
+
+
+@pytest.mark.parametrize("sof_marker", [0xC0, 0xC2])
+def test_jpeg_size(sof_marker):
+    """Read the size from baseline and progressive JPEG frame headers."""
+    assert image_size(_jpeg_header(512, 256, sof_marker)) == (512, 256)
+
+
+def test_jpeg_fill_bytes_before_marker():
+    """Skip 0xFF fill bytes between JPEG segments."""
+    data = _jpeg_header(100, 50)
+    padded = data[:2] + b"\xff" + data[2:]
+
+    assert image_size(padded) == (100, 50)
+
+
+@pytest.mark.parametrize("extension", [".png", ".jpg"])
+def test_size_of_encoded_image(extension):
+    """Match the size of images encoded by OpenCV."""
+    ok, encoded = cv2.imencode(extension, np.zeros((37, 53, 3), dtype=np.uint8))
+
+    assert ok
+    assert image_size(encoded) == (53, 37)
+    assert image_size(encoded.tobytes()) == (53, 37)
+
+
+def test_truncated_headers():
+    """Return None when the header is cut short."""
+    assert image_size(_png_header(640, 480)[:20]) is None
+    jpeg = _jpeg_header(512, 256)
+    assert image_size(jpeg[: len(jpeg) - 12]) is None
+    assert image_size(JPEG_MAGIC) is None
+
+
+def test_unknown_format():
+    """Return None for formats other than JPEG and PNG."""
+    assert image_size(b"GIF89a" + b"\x00" * 32) is None
+    assert image_size(b"") is None
+
+
+def test_non_contiguous_buffer():
+    """Return None for buffers that cannot be viewed as flat bytes."""
+    data = np.frombuffer(_png_header(640, 480) * 2, dtype=np.uint8)[::2]
+
+    assert image_size(data) is None
+
+
+def test_is_jpeg():
+    """Detect the JPEG magic bytes in any buffer."""
+    assert is_jpeg(_jpeg_header(8, 8))
+    assert is_jpeg(memoryview(_jpeg_header(8, 8)))
+    assert not is_jpeg(_png_header(8, 8))
+    assert not is_jpeg(b"")